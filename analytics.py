@@ -0,0 +1,216 @@
+"""
+Level analytics for balance tuning. Measures the levels the game builds for every (difficulty, wins) bucket over many
+seeds and prints a summary table for each bucket. The metrics of a level are:
+-path: the length of the shortest path from the start to the goal (what Difficulty.scale_time uses)
+-time: the time limit the level is given
+-dead_ends: path cells with only one open neighbour
+-junctions: path cells with three or more open neighbours
+-branching: the average number of ways forward at a junction (open neighbours minus the way in)
+-buff_distance: the average distance from the goal to each buff
+-eccentricity: the distance from the start to the cell furthest away from it
+
+The neighbour counts are found in one pass over the whole grid (with numpy when it is installed). The distances come
+from Maze.distance_field() so the search from the goal is the one the level already made. The seeds are shared out
+between a pool of worker processes and each worker sends back the totals for its bucket rather than every level.
+
+Usage:
+python analytics.py --seeds 1000 --difficulty both --wins 0 10 20 30 40 50
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") #Nothing is drawn so no window is needed
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import side
+
+default_seed = 1234
+metric_names = ["path", "time", "dead_ends", "junctions", "branching", "buff_distance", "eccentricity"]
+
+
+def neighbour_counts(maze, grid_size):
+    """
+    Returns the number of open neighbours of every open cell as (dead ends, junctions, total ways forward at the junctions)
+    """
+    np = side.load_numpy()
+    if np is not None:
+        open_cells = maze.grid.to_numpy() == 0
+        padded = np.pad(open_cells, 1).astype(np.int8)
+        counts = padded[:-2, 1:-1] + padded[2:, 1:-1] + padded[1:-1, :-2] + padded[1:-1, 2:] #Open cells above, below, left and right
+        counts = counts[open_cells]
+        junctions = counts[counts >= 3]
+        return int(np.count_nonzero(counts == 1)), len(junctions), int(junctions.sum()) - len(junctions)
+    cells = maze.cells
+    dead_ends = junctions = ways = 0
+    for cell in maze.open_cells:
+        x = cell % grid_size
+        count = (
+            (cell >= grid_size and cells[cell - grid_size] == 0)
+            + (cell < len(cells) - grid_size and cells[cell + grid_size] == 0)
+            + (x > 0 and cells[cell - 1] == 0)
+            + (x < grid_size - 1 and cells[cell + 1] == 0)
+        )
+        if count == 1:
+            dead_ends = dead_ends + 1
+        elif count >= 3:
+            junctions = junctions + 1
+            ways = ways + count - 1
+    return dead_ends, junctions, ways
+
+
+def level_metrics(level):
+    """
+    Returns a dictionary of the metrics of a level
+    """
+    grid_size = level.grid_size
+    maze = level.maze
+    goal_distances, _ = maze.distance_field((level.Goal.x, level.Goal.y), grid_size)
+    start_distances, _ = maze.distance_field((level.player.x, level.player.y), grid_size)
+    dead_ends, junctions, ways = neighbour_counts(maze, grid_size)
+    buff_distances = [goal_distances[Buff.y * grid_size + Buff.x] for Buff in level.Buffs]
+    return {
+        "path": len(level.shortestpath),
+        "time": level.max_time,
+        "dead_ends": dead_ends,
+        "junctions": junctions,
+        "branching": ways / junctions if junctions else 0.0,
+        "buff_distance": sum(buff_distances) / len(buff_distances) if buff_distances else 0.0,
+        "eccentricity": max(start_distances),
+    }
+
+
+def new_totals():
+    """
+    Returns empty totals for a bucket: metric -> [count, sum, min, max]
+    """
+    return {name: [0, 0.0, float("inf"), float("-inf")] for name in metric_names}
+
+
+def add_metrics(totals, metrics):
+    """
+    Adds the metrics of one level to the totals
+    """
+    for name, value in metrics.items():
+        total = totals[name]
+        total[0] = total[0] + 1
+        total[1] = total[1] + value
+        total[2] = min(total[2], value)
+        total[3] = max(total[3], value)
+
+
+def merge_totals(totals, other):
+    """
+    Adds the totals from another worker to the totals
+    """
+    for name, (count, value_sum, low, high) in other.items():
+        total = totals[name]
+        total[0] = total[0] + count
+        total[1] = total[1] + value_sum
+        total[2] = min(total[2], low)
+        total[3] = max(total[3], high)
+
+
+def measure_seeds(task):
+    """
+    Runs in a worker process. Builds the level for every seed in the task and returns the bucket and its totals.
+    """
+    choice, wins, seeds = task
+    difficulty = side.Difficulty(choice)
+    totals = new_totals()
+    for seed in seeds:
+        level = side.Level(difficulty, choice, wins, load_images=False, seed=seed)
+        add_metrics(totals, level_metrics(level))
+    return (choice, wins), totals
+
+
+def tasks(difficulties, wins_list, seeds, chunk_size, base_seed):
+    """
+    Yields (difficultychoice, wins, seeds) chunks covering every seed of every bucket
+    """
+    for choice in difficulties:
+        for wins in wins_list:
+            first = base_seed * 1000003 + (wins * 2 + (1 if choice else 0)) * seeds #Every bucket has its own seeds
+            for start in range(0, seeds, chunk_size):
+                yield choice, wins, range(first + start, first + min(seeds, start + chunk_size))
+
+
+def analyse(args):
+    """
+    Measures every bucket on the process pool and returns a dictionary of (difficultychoice, wins) -> totals
+    """
+    difficulties = {"easy": [True], "hard": [False], "both": [True, False]}[args.difficulty]
+    buckets = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for bucket, totals in executor.map(measure_seeds, tasks(difficulties, args.wins, args.seeds, args.chunk_size, args.seed)):
+            if bucket not in buckets:
+                buckets[bucket] = new_totals()
+            merge_totals(buckets[bucket], totals)
+    return buckets
+
+
+def summary_rows(buckets):
+    """
+    Returns a list of rows, one for each bucket, with the mean, minimum and maximum of every metric
+    """
+    rows = []
+    for (choice, wins), totals in sorted(buckets.items(), key=lambda item: (not item[0][0], item[0][1])):
+        row = {
+            "difficulty": "easy" if choice else "hard",
+            "wins": wins,
+            "grid_size": side.Difficulty(choice).set_values(wins)[0],
+            "levels": totals["path"][0],
+        }
+        for name, (count, value_sum, low, high) in totals.items():
+            row[name] = {"mean": value_sum / count, "min": low, "max": high}
+        rows.append(row)
+    return rows
+
+
+def print_table(rows):
+    """
+    Prints the mean of every metric for each bucket, with the minimum and maximum of the path length
+    """
+    print(
+        f"{'difficulty':<10} {'wins':>4} {'grid':>4} {'levels':>7} {'path':>7} {'path min-max':>13} {'time':>7}"
+        f" {'dead ends':>9} {'junctions':>9} {'branching':>9} {'buff dist':>9} {'eccentric':>9}"
+    )
+    for row in rows:
+        path_range = f"{row['path']['min']}-{row['path']['max']}"
+        print(
+            f"{row['difficulty']:<10} {row['wins']:>4} {row['grid_size']:>4} {row['levels']:>7} {row['path']['mean']:7.1f}"
+            f" {path_range:>13} {row['time']['mean']:7.1f} {row['dead_ends']['mean']:9.1f} {row['junctions']['mean']:9.1f}"
+            f" {row['branching']['mean']:9.2f} {row['buff_distance']['mean']:9.1f} {row['eccentricity']['mean']:9.1f}"
+        )
+
+
+def main():
+    """
+    Reads the command line options, measures the levels and prints the summary tables
+    """
+    parser = argparse.ArgumentParser(description="level analytics for balance tuning")
+    parser.add_argument("--seeds", type=int, default=200, help="levels measured for each (difficulty, wins) bucket")
+    parser.add_argument("--difficulty", choices=["easy", "hard", "both"], default="both")
+    parser.add_argument("--wins", type=int, nargs="+", default=[0, 5, 10, 20, 30, 40, 50], help="win counts to measure")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (defaults to the number of cores)")
+    parser.add_argument("--chunk-size", type=int, default=50, help="levels measured by a worker at a time")
+    parser.add_argument("--seed", type=int, default=default_seed, help="base seed the level seeds are made from")
+    parser.add_argument("--output", default=None, help="also save the summary rows to this JSON file")
+    args = parser.parse_args()
+    if args.seeds < 1 or args.chunk_size < 1 or min(args.wins) < 0:
+        parser.error("--seeds and --chunk-size must be at least 1 and the wins must not be negative")
+
+    start = time.perf_counter()
+    rows = summary_rows(analyse(args))
+    seconds = time.perf_counter() - start
+    print_table(rows)
+    levels = sum(row["levels"] for row in rows)
+    print(f"Measured {levels} levels in {seconds:.2f}s ({levels / seconds if seconds > 0 else 0:.1f} levels/s)")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(rows, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Benchmarks for the maze game. Times maze generation, solving, entity placement, buff placement and drawing the grid
+at every grid size the difficulties can produce, plus the stress sizes. Every case uses a fixed seed so two runs
+(for example before and after a change) can be compared with --compare.
+
+Each result records:
+-the wall time of one operation (min, median and mean over the repeats)
+-the peak memory used by one operation (tracemalloc)
+-the memory blocks that one operation left allocated when it finished (tracemalloc). Blocks that were freed again
+ before the end are not counted, so this is not the total number of allocations (the peak memory includes those)
+
+Usage:
+python bench.py --output before.json
+python bench.py --output after.json
+python bench.py --compare before.json after.json
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") #Drawing happens on an off-screen surface so no window is needed
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import pygame
+
+import side
+
+stress_sizes = [500, 2000]
+default_seed = 1234
+
+
+class FixedDifficulty(side.Difficulty):
+    """
+    A difficulty that always gives the same grid size so levels can be built at any size (including the stress sizes)
+    """
+    def __init__(self, size, choice=False):
+        super().__init__(choice)
+        self.size = size
+
+    def set_values(self, wins):
+        """
+        Returns the fixed grid size and the cell size that fits it on the screen
+        """
+        return self.size, max(1, 841 // self.size)
+
+
+def game_grid_sizes():
+    """
+    Returns every grid size that Difficulty.set_values() can give for both difficulties
+    """
+    sizes = set()
+    for choice in (True, False):
+        difficulty = side.Difficulty(choice)
+        for wins in range(0, 52):
+            sizes.add(difficulty.set_values(wins)[0])
+    return sorted(sizes)
+
+
+def make_maze(size, backend, seed):
+    """
+    Generates the maze for a case
+    """
+    return side.Maze(size, backend=backend, seed=seed)
+
+
+def make_level(size, seed):
+    """
+    Builds a hard level with 50 wins (the most buffs) at the grid size without loading any images
+    """
+    return side.Level(FixedDifficulty(size), False, 50, load_images=False, seed=seed)
+
+
+def case_gen(size, backend, seed):
+    """
+    Maze.gen (or Maze.gen_numpy) through the Maze constructor
+    """
+    def setup():
+        return None
+
+    def op(state):
+        return side.Maze(size, backend=backend, seed=seed)
+    return setup, op
+
+
+def case_solve(size, backend, seed):
+    """
+    Maze.solve between two random free cells
+    """
+    def setup():
+        maze = make_maze(size, backend, seed)
+        start = maze.randfreespot(grid_size=size)
+        goal = maze.randfreespot(start, grid_size=size)
+        return maze, start, goal
+
+    def op(state):
+        maze, start, goal = state
+        maze.fields = {} #Solve from nothing every time instead of reusing the cached distance field
+        return maze.solve(start, goal, size)
+    return setup, op
+
+
+def case_randfreespot(size, backend, seed):
+    """
+    Maze.randfreespot with one excluded cell
+    """
+    def setup():
+        maze = make_maze(size, backend, seed)
+        excluded = maze.randfreespot(grid_size=size)
+        return maze, excluded
+
+    def op(state):
+        maze, excluded = state
+        return maze.randfreespot(excluded, grid_size=size)
+    return setup, op
+
+
+def case_buff_count(size, seed):
+    """
+    Placing the buffs of a level (Level.handle_buff_count, which used to be Game.handle_buff_count)
+    """
+    def setup():
+        level = make_level(size, seed)
+        return level
+
+    def op(level):
+        level.Buffs = []
+        level.maze.rng.seed(seed) #Places the same buffs on every run
+        level.handle_buff_count()
+        return level.Buffs
+    return setup, op
+
+
+def case_draw_grid(size, seed, images_for):
+    """
+    Game.draw_grid onto an off-screen surface the size of the level
+    """
+    def setup():
+        level = make_level(size, seed)
+        game = side.Game(None, False, False, headless=True)
+        game.load_level(level)
+        game.images = images_for(level.cell_size)
+        surface = pygame.Surface((size * level.cell_size, size * level.cell_size)).convert()
+        return game, surface
+
+    def op(state):
+        game, surface = state
+        game.draw_grid(surface)
+        return surface
+    return setup, op
+
+
+def measure(setup, op, repeats):
+    """
+    Times the operation and then runs it once more while tracing the memory
+    """
+    times = []
+    for _ in range(repeats):
+        state = setup()
+        start = time.perf_counter()
+        op(state)
+        times.append(time.perf_counter() - start)
+
+    state = setup()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before_memory = tracemalloc.get_traced_memory()[0]
+    before = tracemalloc.take_snapshot()
+    result = op(state)
+    peak = tracemalloc.get_traced_memory()[1] - before_memory
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(max(0, stat.count_diff) for stat in after.compare_to(before, "lineno")) #Only the blocks still alive after the operation
+    del result
+    return {
+        "repeats": repeats,
+        "time_min": min(times),
+        "time_median": statistics.median(times),
+        "time_mean": statistics.fmean(times),
+        "peak_bytes": peak,
+        "retained_blocks": blocks,
+    }
+
+
+def git_commit():
+    """
+    Returns the commit being benchmarked (or None outside of a git checkout)
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=side.base_dir, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    """
+    Runs every benchmark case and returns the results
+    """
+    pygame.init()
+    pygame.display.set_mode((1, 1)) #Needed so the images can be converted to the display format
+    side.screen = pygame.Surface((side.screen_size, side.screen_size))
+    loader = side.Load()
+
+    def images_for(cell_size):
+        return loader.images(cell_size, side.screen_size)
+
+    sizes = args.sizes or game_grid_sizes()
+    if args.stress and not args.sizes:
+        sizes = sizes + stress_sizes
+    backends = ["python", "eller"] + (["numpy"] if side.load_numpy() is not None else [])
+
+    cases = []
+    for size in sizes:
+        stress = size in stress_sizes
+        repeats = 1 if stress else args.repeat
+        for backend in backends:
+            cases.append(("gen", size, backend, repeats, case_gen(size, backend, args.seed)))
+            cases.append(("solve", size, backend, repeats, case_solve(size, backend, args.seed)))
+            cases.append(("randfreespot", size, backend, repeats, case_randfreespot(size, backend, args.seed)))
+        cases.append(("handle_buff_count", size, "python", repeats, case_buff_count(size, args.seed)))
+        cases.append(("draw_grid", size, "python", repeats, case_draw_grid(size, args.seed, images_for)))
+
+    results = []
+    for name, size, backend, repeats, (setup, op) in cases:
+        if args.only and name not in args.only:
+            continue
+        result = {"name": name, "size": size, "backend": backend}
+        result.update(measure(setup, op, repeats))
+        results.append(result)
+        print(
+            f"{name:<18} {backend:<7} {size:>5}  {result['time_median'] * 1000:10.3f} ms"
+            f"  peak {result['peak_bytes'] / 1024:10.1f} KiB  retained blocks {result['retained_blocks']:>8}"
+        )
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": side.load_numpy().__version__ if side.load_numpy() is not None else None,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(old_path, new_path):
+    """
+    Prints the change in median time and peak memory for every case found in both result files
+    """
+    with open(old_path) as file:
+        old = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
+    old_results = {(r["name"], r["backend"], r["size"]): r for r in old["results"]}
+    print(f"{'case':<18} {'backend':<7} {'size':>5}  {'old ms':>10} {'new ms':>10} {'speedup':>8}  {'peak old/new KiB':>20}")
+    for result in new["results"]:
+        key = (result["name"], result["backend"], result["size"])
+        if key not in old_results:
+            continue
+        before = old_results[key]
+        speedup = before["time_median"] / result["time_median"] if result["time_median"] > 0 else float("inf")
+        print(
+            f"{key[0]:<18} {key[1]:<7} {key[2]:>5}  {before['time_median'] * 1000:10.3f} {result['time_median'] * 1000:10.3f}"
+            f" {speedup:7.2f}x  {before['peak_bytes'] / 1024:9.1f}/{result['peak_bytes'] / 1024:<9.1f}"
+        )
+
+
+def main():
+    """
+    Runs the benchmarks or compares two result files
+    """
+    parser = argparse.ArgumentParser(description="maze game benchmarks")
+    parser.add_argument("--output", default="bench_results.json", help="file the JSON results are saved to")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs of each case (the stress sizes run once)")
+    parser.add_argument("--seed", type=int, default=default_seed, help="seed used by every case")
+    parser.add_argument("--no-stress", dest="stress", action="store_false", help="skip the 500 and 2000 stress sizes")
+    parser.add_argument("--sizes", nargs="+", type=int, help="only run these grid sizes")
+    parser.add_argument("--only", nargs="+", help="only run these cases (gen, solve, randfreespot, handle_buff_count, draw_grid)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    results = run(args)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Saved {len(results['results'])} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
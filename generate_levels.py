@@ -0,0 +1,120 @@
+"""
+Generates a large number of levels for balance testing and saves them into a level pack (see LevelPackWriter in side.py).
+The levels are built on a pool of worker processes. Every level gets its own seed made from the base seed and the
+position of the level in the run, so the same command always gives the same pack however many workers are used.
+The levels are sent back to the main process in chunks and written to disk straight away, so only a few chunks are
+ever held in memory at once.
+
+Usage:
+python generate_levels.py --levels 10000 --difficulty both --output levels.pack
+python side.py --headless --level-pack levels.pack
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") #The workers never draw anything so no window is needed
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+import argparse
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import side
+
+default_seed = 1234
+
+
+def level_specs(count, difficulties, min_wins, max_wins, seed):
+    """
+    Yields (difficultychoice, wins, level seed) for every level in the run.
+    The levels cycle through the difficulties and win counts so every combination gets about the same number of levels.
+    """
+    combinations = [(choice, wins) for choice in difficulties for wins in range(min_wins, max_wins + 1)]
+    for number in range(count):
+        choice, wins = combinations[number % len(combinations)]
+        yield choice, wins, seed * 1000003 + number #Different for every level and the same on every run
+
+
+def chunks(specs, chunk_size):
+    """
+    Splits the level specs into lists of chunk_size
+    """
+    chunk = []
+    for spec in specs:
+        chunk.append(spec)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def build_chunk(chunk):
+    """
+    Runs in a worker process. Builds every level in the chunk and returns them as level pack records,
+    because the records are much smaller to send back to the main process than the Level objects.
+    """
+    records = []
+    difficulties = {}
+    for choice, wins, seed in chunk:
+        if choice not in difficulties:
+            difficulties[choice] = side.Difficulty(choice)
+        level = side.Level(difficulties[choice], choice, wins, load_images=False, seed=seed)
+        records.append((side.encode_level(level), wins, choice))
+    return records
+
+
+def generate(args):
+    """
+    Builds the levels on the process pool and writes each finished chunk to the pack in order.
+    Returns the number of levels written.
+    """
+    difficulties = {"easy": [True], "hard": [False], "both": [True, False]}[args.difficulty]
+    work = chunks(level_specs(args.levels, difficulties, args.min_wins, args.max_wins, args.seed), args.chunk_size)
+    workers = args.workers or os.cpu_count() or 1
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor, side.LevelPackWriter(args.output) as writer:
+        pending = deque()
+        for chunk in work:
+            pending.append(executor.submit(build_chunk, chunk))
+            if len(pending) >= workers * 2: #Only keeps a couple of chunks per worker waiting to be written
+                written = written + write_chunk(writer, pending.popleft().result())
+        while pending:
+            written = written + write_chunk(writer, pending.popleft().result())
+    return written
+
+
+def write_chunk(writer, records):
+    """
+    Writes the records from one chunk into the pack and returns how many there were
+    """
+    for record, wins, choice in records:
+        writer.add_record(record, wins, choice)
+    return len(records)
+
+
+def main():
+    """
+    Reads the command line options, generates the levels and reports the speed
+    """
+    parser = argparse.ArgumentParser(description="generate a level pack for balance testing")
+    parser.add_argument("--levels", type=int, default=10000, help="number of levels to generate")
+    parser.add_argument("--difficulty", choices=["easy", "hard", "both"], default="both")
+    parser.add_argument("--min-wins", type=int, default=0, help="lowest win count to generate levels for")
+    parser.add_argument("--max-wins", type=int, default=50, help="highest win count to generate levels for")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (defaults to the number of cores)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="levels built by a worker before they are sent back")
+    parser.add_argument("--seed", type=int, default=default_seed, help="base seed the level seeds are made from")
+    parser.add_argument("--output", default="levels.pack", help="level pack file to write")
+    args = parser.parse_args()
+    if args.levels < 0 or args.chunk_size < 1 or args.min_wins < 0 or args.max_wins < args.min_wins:
+        parser.error("--levels must not be negative, --chunk-size must be at least 1 and the wins must be a valid range")
+    if args.seed < 0 or args.seed * 1000003 + args.levels >= 2 ** 64: #Every level seed has to fit in the pack's 64 bit seed field
+        parser.error("--seed must not be negative and the level seeds made from it must fit in 64 bits")
+
+    start = time.perf_counter()
+    written = generate(args)
+    seconds = time.perf_counter() - start
+    print(f"Wrote {written} levels to {args.output} in {seconds:.2f}s ({written / seconds if seconds > 0 else 0:.1f} levels/s)")
+
+
+if __name__ == "__main__":
+    main()
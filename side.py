@@ -1,30 +1,265 @@
+import time
+startup_started = time.perf_counter() #Taken before the other imports (pygame is the slowest part of starting up) so the time to the first menu frame includes them
 import pygame
 import random
-import heapq
-import time
 import math
 import os
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
-
-pygame.init()
+import argparse
+import hashlib
+import json
+import itertools
+import mmap
+import sqlite3
+import struct
+from array import array
+import threading
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+np = None #numpy, once load_numpy() has imported it. Only the numpy maze backend needs it and it is slow to import
+numpy_checked = False #True once load_numpy() has tried to import numpy
+
+def load_numpy():
+    """
+    Imports numpy the first time it is needed and returns it (or None if it is not installed)
+    """
+    global np, numpy_checked
+    if numpy_checked == False:
+        numpy_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
 
 #constants
+base_dir = os.path.dirname(os.path.abspath(__file__)) #Folder of this file so the assets can be found from any working directory
 grid_size = 10  #20x20 grid
 cell_size = 84  #each cell is 20x20 pixels (always round down when changing the cell size in the function) y=814/x
 screen_size = grid_size * cell_size
 directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+logic_tick = 0.1 #Seconds per step of the game logic. Holding a movement key moves the player once per step
+chase_interval = logic_tick * 3 #Seconds between the enemy's moves when it is chasing the player
+chase_head_start = 3 #Seconds at the start of a level before the enemy starts chasing
+loss_duration = 12 #Seconds the loss sound plays for before the next level starts
+loss_reveal_time = 3 #Seconds the trail takes to be drawn one cell at a time after a loss
+camera_cell_size = 42 #Smallest cell size in pixels when the camera follows the player (20x20 cells fit on the screen)
+movement_keys = {
+    pygame.K_LEFT: (-1, 0), pygame.K_a: (-1, 0),
+    pygame.K_RIGHT: (1, 0), pygame.K_d: (1, 0),
+    pygame.K_UP: (0, -1), pygame.K_w: (0, -1),
+    pygame.K_DOWN: (0, 1), pygame.K_s: (0, 1),
+} #Key -> the direction it moves the player
+screen = None #The display surface. This is only created by main() so the module can be imported without opening a window
+
+class AssetCache:
+    """
+    Keeps the decoded images for the whole time the program is running so each image file is only read from disk once.
+    The scaled copies of the images are kept in a least recently used (LRU) cache keyed by (path, size). The LRU cache
+    has a memory limit so the oldest scaled images are thrown away first when a lot of different sizes have been used.
+    The menu images are always scaled to the screen size, so they are kept separately and never thrown away.
+    """
+    def __init__(self, memory_limit=64 * 1024 * 1024):
+        """
+        Initialize the empty caches. The memory limit is in bytes and only counts the scaled images.
+        """
+        self.memory_limit = memory_limit
+        self.memory_used = 0
+        self.folders = {} #Dictionary of folder -> sorted list of image paths in that folder
+        self.decoded = {} #Dictionary of path -> decoded and converted surface at its original size
+        self.scaled = OrderedDict() #(path, size) -> scaled surface. The order is the order of use (oldest first)
+        self.screen_images = {} #path -> surface scaled to the screen size (the menus). Every level uses the same ones so they are kept outside the LRU cache
+        self.atlases = OrderedDict() #cell size -> Atlas of the tile images at that size. The order is the order of use (oldest first)
+        self.atlas_limit = 8 #Most atlases kept at once
+        self.lock = threading.RLock() #Levels can be built on a background thread so only one thread may use the cache at a time
+
+    def listdir(self, assets_folder):
+        """
+        Returns the image paths inside a folder. The folder is only read from disk the first time.
+        """
+        with self.lock:
+            return self.listdir_locked(assets_folder)
+
+    def listdir_locked(self, assets_folder):
+        """
+        Does the work for listdir() once the lock is held
+        """
+        if assets_folder not in self.folders:
+            self.folders[assets_folder] = [
+                os.path.join(assets_folder, img_file) #dynamically appends the list using os.path() to help make the program more portable
+                for img_file in sorted(os.listdir(assets_folder))
+                if img_file.endswith((".png", ".jpeg", ".jpg"))
+            ]
+        return self.folders[assets_folder]
+
+    def decode(self, path):
+        """
+        Decodes an image file once and converts it to the pixel format of the screen so drawing it stays fast.
+        Images with see-through pixels use convert_alpha() and fully solid images use the faster convert().
+        """
+        if path not in self.decoded:
+            loaded_image = pygame.image.load(path)
+            width, height = loaded_image.get_size()
+            if loaded_image.get_flags() & pygame.SRCALPHA and pygame.mask.from_surface(loaded_image, 254).count() < width * height:
+                self.decoded[path] = loaded_image.convert_alpha() #Keeps the transparency for the ships, trail and buff
+            else:
+                self.decoded[path] = loaded_image.convert() #Solid images such as the walls and menus
+        return self.decoded[path]
+
+    def get(self, path, scaling):
+        """
+        Returns the image at path scaled to (scaling x scaling). Scaled images are reused until they are pushed out of the cache.
+        """
+        with self.lock:
+            return self.get_locked(path, scaling)
+
+    def get_locked(self, path, scaling):
+        """
+        Does the work for get() once the lock is held
+        """
+        if scaling == screen_size:
+            scaled_image = self.screen_images.get(path)
+            if scaled_image is None:
+                scaled_image = pygame.transform.scale(self.decode(path), (scaling, scaling))
+                self.screen_images[path] = scaled_image
+            return scaled_image
+        key = (path, scaling)
+        scaled_image = self.scaled.get(key)
+        if scaled_image is not None:
+            self.scaled.move_to_end(key) #Marks the image as the most recently used
+            return scaled_image
+        scaled_image = pygame.transform.scale(self.decode(path), (scaling, scaling)) #Scales the image to the scale in the parameter (cell_size or screen_size)
+        self.scaled[key] = scaled_image
+        self.memory_used = self.memory_used + self.surface_bytes(scaled_image)
+        while self.memory_used > self.memory_limit and len(self.scaled) > 1: #Removes the least recently used images until the cache fits in the limit
+            _, old_image = self.scaled.popitem(last=False)
+            self.memory_used = self.memory_used - self.surface_bytes(old_image)
+        return scaled_image
+
+    def atlas(self, images, cell_size):
+        """
+        Returns the atlas of the tile images (the first 7 images) for the cell size. It is only built the first time.
+        """
+        with self.lock:
+            atlas = self.atlases.get(cell_size)
+            if atlas is None:
+                atlas = Atlas(images[:7], cell_size)
+                self.atlases[cell_size] = atlas
+                if len(self.atlases) > self.atlas_limit: #Removes the least recently used atlas
+                    self.atlases.popitem(last=False)
+            else:
+                self.atlases.move_to_end(cell_size)
+            return atlas
+
+    def surface_bytes(self, surface):
+        """
+        Returns the amount of memory used by the pixels of a surface
+        """
+        return surface.get_pitch() * surface.get_height()
+
+class Atlas:
+    """
+    All the scaled tile and entity images for one cell size packed side by side into two surfaces. Drawing a
+    layer is then one Surface.blits() call with a list of (atlas, position, area) instead of one blit() per image.
+    The wall and path tiles are solid so they go in an atlas without alpha, which is copied straight onto the screen.
+    Only the entities, trail and buff go in the atlas with alpha, which has to be blended.
+    The tiles are in the same order as the images list:
+    0 = wall, 1 = path, 2 = player ship, 3 = goal, 4 = trail, 5 = enemy ship, 6 = clock buff
+    """
+    solid_tiles = 2 #The first 2 tiles (wall and path) never have see-through pixels
+
+    def __init__(self, tile_images, cell_size):
+        """
+        Copies each tile image into its own cell_size square of one of the atlases
+        """
+        self.cell_size = cell_size
+        self.solid_surface = pygame.Surface((cell_size * self.solid_tiles, cell_size)).convert()
+        self.surface = pygame.Surface((cell_size * max(1, len(tile_images) - self.solid_tiles), cell_size), pygame.SRCALPHA).convert_alpha()
+        self.areas = [] #The (atlas, area) that each tile is in
+        for index, image in enumerate(tile_images):
+            if index < self.solid_tiles:
+                surface, area = self.solid_surface, pygame.Rect(index * cell_size, 0, cell_size, cell_size)
+            else:
+                surface, area = self.surface, pygame.Rect((index - self.solid_tiles) * cell_size, 0, cell_size, cell_size)
+            surface.blit(image, area)
+            self.areas.append((surface, area))
+
+    def sprite(self, index, x, y, origin=(0, 0)):
+        """
+        Returns the blit for the tile at grid position (x, y). The origin is the grid position drawn at the top left
+        (it is only moved away from (0, 0) by the camera).
+        """
+        surface, area = self.areas[index]
+        return (surface, ((x - origin[0]) * self.cell_size, (y - origin[1]) * self.cell_size), area)
+
+class LazyImages:
+    """
+    The images list from Load.images() with the images decoded and scaled on a background thread instead of before it is
+    returned. It is used like a list (index or slice). An image that the background thread has not got to yet is decoded
+    straight away on the thread that needs it, so the menus never have to wait for the rest of the images.
+    """
+    def __init__(self, loader, entries):
+        """
+        The entries are (path, scaling) for every image in the list
+        """
+        self.loader = loader
+        self.entries = entries
+        self.loaded = [None] * len(entries) #The scaled image at each index (None until it has been decoded)
+        self.thread = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[number] for number in range(*index.indices(len(self)))]
+        image = self.loaded[index]
+        if image is None: #Not decoded by the background thread yet
+            path, scaling = self.entries[index]
+            image = self.loader.scale([path], scaling)[0] #The asset cache lock stops both threads decoding it at once
+            self.loaded[index] = image
+        return image
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def load_in_background(self):
+        """
+        Starts decoding every image that is not loaded yet on a background thread, in list order
+        """
+        self.thread = threading.Thread(target=self.load_all, daemon=True)
+        self.thread.start()
+
+    def load_all(self):
+        """
+        Decodes every image. Each one is decoded with a separate call so the main thread can take the cache lock in between.
+        """
+        for index in range(len(self)):
+            self[index]
 
 class Load: #Load each of the images and scale them to fit the screen or cell in the grid
-    def images(self, cell_size, screen_size):
+    def images(self, cell_size, screen_size, first=None):
         """
-        Loads and scales images from the assets folders.
+        Loads and scales images from the assets folders. The images come from the asset cache so
+        only the first call reads the files from disk.
+        If the indexes of the images needed first are given, only those are decoded before this returns and the
+        rest are decoded on a background thread (see LazyImages).
         """
-        assets_folders = ["./Assets/Tile Images", "./Assets/Menu Images"]
+        assets_folders = [os.path.join(base_dir, "Assets", "Tile Images"), os.path.join(base_dir, "Assets", "Menu Images")]
 
         # Load raw image paths
         tile_images_raw = self.load_assets(assets_folders[0])
         menu_images_raw = self.load_assets(assets_folders[1])
 
+        if first is not None:
+            images = LazyImages(self, [(path, cell_size) for path in tile_images_raw] + [(path, screen_size) for path in menu_images_raw])
+            for index in first:
+                images[index]
+            images.load_in_background()
+            return images
+
         # Scale the images
         tile_images = self.scale(tile_images_raw, cell_size)
         menu_images = self.scale(menu_images_raw, screen_size)
@@ -37,14 +272,7 @@ class Load: #Load each of the images and scale them to fit the screen or cell in
         """
         file_images = []
         try:
-            for img_file in sorted(os.listdir(assets_folder)):
-                try:
-                    if img_file.endswith((".png", ".jpeg", ".jpg")):
-                        # Append the full path of the image file
-                        file_images.append(os.path.join(assets_folder, img_file)) #dynamically appends the list using os.path() to help make the program more portable
-                except FileNotFoundError as e:
-                    print(f"Error loading file {img_file}: {e}") #Error message printed when failing to load
-                    self.placeholder()
+            file_images = asset_cache.listdir(assets_folder)
         except Exception as e:
             print(f"Assets folder is not present: {e}")
             self.placeholder()
@@ -79,10 +307,8 @@ class Load: #Load each of the images and scale them to fit the screen or cell in
         scaled_images = []  # Initialize a list to store scaled images
         for img in file_images_raw:
             try:
-                # Load the image and scale it
-                loaded_image = pygame.image.load(img)
-                scaled_image = pygame.transform.scale(loaded_image, (scaling, scaling)) #Scales the image to the scale in the parameter (cell_size or screen_size)
-                scaled_images.append(scaled_image)
+                # Fetch the decoded image from the cache and scale it
+                scaled_images.append(asset_cache.get(img, scaling))
             except Exception as e:
                 print(f"Error scaling image {img}: {e}") #Print error message if scaling fails
                 # Add a placeholder image in case of an error
@@ -92,110 +318,315 @@ class Load: #Load each of the images and scale them to fit the screen or cell in
         return scaled_images
 
     #Draw each of the loaded images into their cell and scaled properly
-    def entities(Goal, player, enemy, Buffs, images, cell_size): 
+    def entities(Goal, player, enemy, Buffs, images, cell_size, origin=(0, 0)): 
         """
-        Scales and draws all the entities according to their variable cell sizes.
+        Draws all the entities according to their variable cell sizes. Every entity is drawn from the tile atlas
+        with one call to screen.blits(). The origin is the grid position at the top left of the screen.
         """
-        #screen.blit() draws a surface onto the screen; The surface being the scaled iamges.
-        screen.blit(images[3], (Goal.x * cell_size, Goal.y * cell_size)) #Index 3 is the goal
-        screen.blit(images[2], (player.x * cell_size, player.y * cell_size)) #Index 2 is the player ship
-        screen.blit(images[5], (enemy.x * cell_size, enemy.y * cell_size)) #Index 5 is the enemy ship
+        atlas = asset_cache.atlas(images, cell_size)
+        sprites = [
+            atlas.sprite(3, Goal.x, Goal.y, origin), #Index 3 is the goal
+            atlas.sprite(2, player.x, player.y, origin), #Index 2 is the player ship
+            atlas.sprite(5, enemy.x, enemy.y, origin), #Index 5 is the enemy ship
+        ]
         #Do the same for each buff present
-        for Buff in Buffs: 
-            screen.blit(images[6], (Buff.x * cell_size, Buff.y * cell_size)) #Index 6 is the clock buff
+        sprites.extend(atlas.sprite(6, Buff.x, Buff.y, origin) for Buff in Buffs) #Index 6 is the clock buff
+        screen.blits(sprites, doreturn=False)
 
     #Unload the buffs by loading all the entities again but without loading the buffs
-    def unloadBuff(Goal, player, enemy, Buffs, images, cell_size):
+    def unloadBuff(Goal, player, enemy, Buffs, images, cell_size, origin=(0, 0)):
         """
-        Re-scales and draws all the entities according to their variable cell sizes but without loading the buff.
+        Draws all the entities according to their variable cell sizes but without drawing the buffs.
         """
-        screen.blit(images[3], (Goal.x * cell_size, Goal.y * cell_size)) #Index 3 is the goal
-        screen.blit(images[2], (player.x * cell_size, player.y * cell_size)) #Index 2 is the player ship
-        screen.blit(images[5], (enemy.x * cell_size, enemy.y * cell_size)) #Index 5 is the enemy ship
+        Load.entities(Goal, player, enemy, [], images, cell_size, origin)
 
     #Draw each cell represented by the shortestpath tuple as the trail image to show the trail
-    def loadTrail(shortestpath, cell_size, images):
+    def loadTrail(shortestpath, cell_size, images, surface=None, origin=(0, 0)):
+        """
+        Draws the shortest path in the maze using the alientrail.png images. The trail is drawn onto the screen
+        unless another surface (such as the pre-drawn maze background) is given.
+        """
+        if surface is None:
+            surface = screen
+        atlas = asset_cache.atlas(images, cell_size)
+        surface.blits([atlas.sprite(4, px, py, origin) for px, py in shortestpath], doreturn=False) #Draws the trail image (Index 4 is the trail image).
+
+    #Find the cells that the entities cover so only those parts of the screen need to be redrawn
+    def entityRects(Goal, player, enemy, Buffs, cell_size, origin=(0, 0)):
         """
-        Draws the shortest path in the maze using the alientrail.png images
+        Returns the screen rectangles covered by each entity
         """
-        for px, py in shortestpath:
-                screen.blit(images[4], (px * cell_size, py * cell_size)) #Draws the trail image (Index 4 is the trail image).
+        left, top = origin
+        rects = [pygame.Rect((entity.x - left) * cell_size, (entity.y - top) * cell_size, cell_size, cell_size) for entity in (Goal, player, enemy)]
+        for Buff in Buffs:
+            rects.append(pygame.Rect((Buff.x - left) * cell_size, (Buff.y - top) * cell_size, cell_size, cell_size))
+        return rects
 
 #Handles all the audio within the game
 class Audio:
     """
-    Handles all the audio in the game
+    Handles all the audio in the game. One Audio object (audio) is shared by the menus and every game so each sound
+    file is only read and decoded once:
+    -the soundtrack is the longest track so it is streamed with pygame.mixer.music instead of being decoded into memory.
+     It is loaded once and then only started and faded out, never unloaded
+    -the loss sound and the sound effects are decoded into Sound objects once when the audio starts
+    -the loss sound plays on its own reserved channel so it can crossfade with the soundtrack
+    -the sound effects play on a fixed pool of reserved channels. If every channel is busy the next one in turn is reused
     """
-    #Initialize the sounds 
-    def __init__(self):
+    def __init__(self, effect_channels=4, crossfade=500):
+        """
+        Initialize local variables. Nothing is loaded until start() is called (the mixer needs pygame to be initialized).
+        The crossfade is in milliseconds.
+        """
+        self.effect_channels = effect_channels
+        self.crossfade = crossfade
+        self.ready = False
+        self.sounds = {} #Dictionary of file name -> decoded Sound (or None if the file failed to load)
+
+    def start(self):
+        """
+        Starts the mixer, reserves the channels and loads every sound. This only does anything the first time it is called.
+        """
+        if self.ready == True:
+            return
+        self.ready = True
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+        pygame.mixer.set_num_channels(1 + self.effect_channels)
+        pygame.mixer.set_reserved(1 + self.effect_channels) #Sounds can only play on the channels given out below
+        self.music_channel = pygame.mixer.Channel(0) #Plays the loss sound
+        self.effect_pool = [pygame.mixer.Channel(number) for number in range(1, 1 + self.effect_channels)]
+        self.next_effect = 0
+        try:
+            pygame.mixer.music.load(os.path.join(base_dir, "Assets", "Audio files", "FunkySounds.mp3"))
+            pygame.mixer.music.set_volume(0.3)
+            self.soundtrack_loaded = True
+        except Exception as e:
+            print(f"Soundtrack not found: {e}") #Print debug in case soundtrack doesnt load
+            self.soundtrack_loaded = False
+        for file_name in ("WinSound.mp3", "BuffSound.mp3", "ScarySounds.mp3"):
+            self.sound(file_name)
+        if self.sounds["ScarySounds.mp3"] is not None:
+            self.sounds["ScarySounds.mp3"].set_volume(0.3) #The same volume as the soundtrack
+
+    def sound(self, file_name):
         """
-        Initialize local variables and load the sound files
+        Returns the decoded sound from the audio files folder. Each file is only decoded the first time.
         """
-        pygame.mixer.init()
-        try:
-            self.win_sound = pygame.mixer.Sound("./Assets/Audio files/WinSound.mp3") 
-            self.buff_sound = pygame.mixer.Sound("./Assets/Audio files/BuffSound.mp3")
-        except FileNotFoundError as e:
-            print(f"Sound file(s) not found: {e}") #Print debug in case the sounds fail to load
-            self.win_sound = None
-            self.buff_sound = None
+        if file_name not in self.sounds:
+            try:
+                self.sounds[file_name] = pygame.mixer.Sound(os.path.join(base_dir, "Assets", "Audio files", file_name))
+            except (FileNotFoundError, pygame.error) as e:
+                print(f"Sound file not found: {e}") #Print debug in case the sound fails to load
+                self.sounds[file_name] = None
+        return self.sounds[file_name]
 
     #Play the main theme indefinitely
     def play_soundtrack(self):
         """
-        Play the main soundtrack. This is loaded into the pygame.mixer.music() library function rather than the pygame.mixer.Sound() 
-        library function since the Sound() one loads multiple audio tracks and takes more memory. music() is a more static library function
-        which conserves memory. It's used for the longer tracks such as this
+        Play the main soundtrack. It fades in while the loss sound (if it is playing) fades out.
         """
-        try:
-            pygame.mixer.music.load("./Assets/Audio files/FunkySounds.mp3")
-            pygame.mixer.music.set_volume(0.3)
-            pygame.mixer.music.play(-1) #.play(-1) means it will play indefinitely until stopped
-        except Exception as e:
-            print(f"Soundtrack not found: {e}") #Print debug in case soundtrack doesnt load
+        self.start()
+        self.music_channel.fadeout(self.crossfade)
+        if self.soundtrack_loaded == True:
+            pygame.mixer.music.play(-1, fade_ms=self.crossfade) #.play(-1) means it will play indefinitely until stopped
 
     #Play the loss sound effect
     def play_loss(self):
         """
-        Play loss soundtrack. This is loaded into the pygame.mixer.music() library function rather than the pygame.mixer.Sound() 
-        library function since the Sound() one loads multiple audio tracks and takes more memory. music() is a more static library function
-        which conserves memory. It's used for the longer tracks such as this
+        Play the loss sound once. It fades in on its own channel while the soundtrack fades out.
         """
-        try:
-            pygame.mixer.music.load("./Assets/Audio files/ScarySounds.mp3")
-            pygame.mixer.music.set_volume(0.3)
-            pygame.mixer.music.play(1) #.play(1) means it will play only once
-        except Exception as e:
-            print(f"Loss sound not found: {e}") #Print debug in case loss track doesnt load
+        self.start()
+        pygame.mixer.music.fadeout(self.crossfade)
+        loss_sound = self.sounds["ScarySounds.mp3"]
+        if loss_sound is None:
+            print("Loss sound is not present")
+            return
+        self.music_channel.play(loss_sound, fade_ms=self.crossfade)
 
-    #Stop the music in use (loss sound or main theme). These are put into the pygame.mixer.music library section instead of the pygame.mixer.Sound library section since only one music track can be loaded at a time and the 2 longest audio tracks are loaded into them to save processing power
+    #Stop the music in use (loss sound or main theme) and any sound effects
     def stop(self):
         """
-        stops the soundtrack and unloads it to save memory
+        stops the soundtrack and the sounds. Nothing is unloaded so they can be played again straight away
         """
+        self.start()
         pygame.mixer.stop()
-        pygame.mixer.music.unload()
+        pygame.mixer.music.stop()
+
+    def play_effect(self, file_name):
+        """
+        Plays a sound effect on the first free channel in the effect pool, or on the next channel in turn if they are all busy
+        """
+        self.start()
+        effect = self.sounds.get(file_name)
+        if effect is None:
+            print(f"{file_name} is not present")
+            return
+        for channel in self.effect_pool:
+            if not channel.get_busy():
+                break
+        else:
+            channel = self.effect_pool[self.next_effect]
+            self.next_effect = (self.next_effect + 1) % len(self.effect_pool)
+        channel.play(effect)
     
     def play_win(self):
         """
         plays the win sound
         """
-        try:
-            self.win_sound.play()
-        except:
-            print("Win sound is not present")
+        self.play_effect("WinSound.mp3")
 
     def play_buff(self):
         """
         plays the sound when getting a buff
         """
+        self.play_effect("BuffSound.mp3")
+
+class SilentAudio:
+    """
+    Stands in for the Audio class when the game runs without a window (headless) so no sounds are loaded or played
+    """
+    def play_soundtrack(self):
+        pass
+
+    def play_loss(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def play_win(self):
+        pass
+
+    def play_buff(self):
+        pass
+
+legacy_difficulty = -1 #Difficulty saved with the top score copied from scores.txt, which did not record one
+
+class ScoreStore:
+    """
+    Keeps every finished game's score in an SQLite database. Scores are only ever added (never rewritten) and
+    SQLite's write ahead log (WAL) keeps the file safe if the game crashes, and lets two games add scores at the
+    same time while the leaderboard is being read. The indexes let the top scores and a player's best be found
+    without reading the whole table. Simulations should use their own file so they never slow down the leaderboard.
+    """
+    def __init__(self, path, legacy_file=None):
+        """
+        Opens (or creates) the database. If it is new and the old scores.txt file is given, its top score is copied in.
+        """
+        self.connection = sqlite3.connect(path, timeout=10)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL") #WAL is still safe from corruption with this and writes are much faster
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS scores ("
+                "id INTEGER PRIMARY KEY, player TEXT NOT NULL, difficulty INTEGER NOT NULL, "
+                "score INTEGER NOT NULL, wins INTEGER NOT NULL, date REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS scores_by_score ON scores (score DESC)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS scores_by_difficulty ON scores (difficulty, score DESC)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS scores_by_date ON scores (difficulty, date)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS scores_by_player ON scores (player, score DESC)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS scores_by_player_difficulty ON scores (player, difficulty, score DESC)")
+            self.connection.execute( #Stores made before the legacy score had its own difficulty filed it under easy
+                "UPDATE scores SET difficulty = ? WHERE player = 'scores.txt' AND wins = 0 AND difficulty = 1", (legacy_difficulty,)
+            )
+        if legacy_file is not None and self.count() == 0:
+            self.import_legacy(legacy_file)
+
+    def import_legacy(self, legacy_file):
+        """
+        Copies the top score from the old scores.txt file (current score on the first line, top score on the second).
+        The file did not say which difficulty the score was for, so it is saved with legacy_difficulty. It then counts
+        towards the best scores of both difficulties together but not towards the scores of either one.
+        """
         try:
-            self.buff_sound.play()
-        except:
-            print("Buff sound is not present")
+            with open(legacy_file, "r") as file:
+                lines = file.readlines()
+            top_score = int(lines[1].strip())
+        except (FileNotFoundError, ValueError, IndexError):
+            return
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO scores (player, difficulty, score, wins, date) VALUES (?, ?, ?, ?, ?)",
+                ("scores.txt", legacy_difficulty, top_score, 0, time.time()),
+            )
+
+    def add(self, score, wins, difficultychoice, player="player"):
+        """
+        Adds the score of one game
+        """
+        self.add_many([(player, difficultychoice, score, wins, time.time())])
+
+    def add_many(self, rows):
+        """
+        Adds many scores at once in one transaction. Each row is (player, difficultychoice, score, wins, date).
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO scores (player, difficulty, score, wins, date) VALUES (?, ?, ?, ?, ?)",
+                ((player, 1 if choice else 0, score, wins, date) for player, choice, score, wins, date in rows),
+            )
+
+    def count(self):
+        """
+        Returns the number of scores saved
+        """
+        return self.connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def top(self, k=10, difficultychoice=None):
+        """
+        Returns the k best scores as (player, score, wins, date), for one difficulty or for both if none is given
+        """
+        if difficultychoice is None:
+            query = self.connection.execute("SELECT player, score, wins, date FROM scores ORDER BY score DESC LIMIT ?", (k,))
+        else:
+            query = self.connection.execute(
+                "SELECT player, score, wins, date FROM scores WHERE difficulty = ? ORDER BY score DESC LIMIT ?",
+                (1 if difficultychoice else 0, k),
+            )
+        return query.fetchall()
+
+    def top_score(self, difficultychoice=None):
+        """
+        Returns the best score (0 if there are no scores yet)
+        """
+        best = self.top(1, difficultychoice)
+        return best[0][1] if best else 0
+
+    def best(self, player, difficultychoice=None):
+        """
+        Returns a player's best score (0 if they have no scores yet)
+        """
+        if difficultychoice is None:
+            query = self.connection.execute("SELECT score FROM scores WHERE player = ? ORDER BY score DESC LIMIT 1", (player,))
+        else:
+            query = self.connection.execute(
+                "SELECT score FROM scores WHERE player = ? AND difficulty = ? ORDER BY score DESC LIMIT 1",
+                (player, 1 if difficultychoice else 0),
+            ) #Reads one entry of the scores_by_player_difficulty index
+        best = query.fetchone()
+        return best[0] if best is not None else 0
+
+    def since(self, date, difficultychoice):
+        """
+        Returns the scores for a difficulty from the date onwards (oldest first) as (player, score, wins, date)
+        """
+        return self.connection.execute(
+            "SELECT player, score, wins, date FROM scores WHERE difficulty = ? AND date >= ? ORDER BY date",
+            (1 if difficultychoice else 0, date),
+        ).fetchall()
+
+    def close(self):
+        """
+        Closes the database
+        """
+        self.connection.close()
 
 #Handles all the menu and tutorial pages
 class Menu:
+    first_frame_time = None #Seconds from startup_started until the first menu frame was shown
+
     #Initialize all the local variables
     def __init__(self, images):
         """
@@ -206,26 +637,49 @@ class Menu:
         self.in_loop = True
         self.choice = True
     
-    def show_menu(self):
+    def animate(self, frames, handle_key):
         """
-        Shows 2 similar looking menu images which flicker between eachother at short intervals to imitate a draw or plaful effect for the
-        target audience. The self.images list is ordered in a way that the image that is similar to the other is the next index. Thus
-        self.images[self.menu_image] and self.images[self.menu_image + 1] is used.
+        Shows a menu screen made of 2 frames which are switched every 200ms (int(time.time() * 5) % 2). The screen is only drawn and
+        the display only updated when the frame changes or a key is pressed. The rest of the time is spent asleep in pygame.event.wait()
+        until the next frame change or event, so the menus use almost no processing power. handle_key is given every key press
+        event and ends the menu by setting self.in_loop to False.
         """
-        clock = pygame.time.Clock()
         self.in_loop = True
+        shown_frame = None
         while self.in_loop:
-            for event in pygame.event.get(): #Gets all the input events in pygame.
+            frame = int(time.time() * 5) % 2
+            if frame != shown_frame: #Only draws when the frame has changed
+                screen.blit(frames[frame], (0, 0)) #Draws the menu onto the screen
+                pygame.display.update() #Updates the display to show the changes
+                shown_frame = frame
+                if Menu.first_frame_time is None:
+                    Menu.first_frame_time = time.perf_counter() - startup_started
+                    profiler.record("startup.first_frame", Menu.first_frame_time)
+            next_frame = (math.floor(time.time() * 5) + 1) / 5 #The time of the next frame change
+            event = pygame.event.wait(max(1, int((next_frame - time.time()) * 1000)))
+            events = [] if event.type == pygame.NOEVENT else [event] + pygame.event.get()
+            for event in events: #Gets all the input events in pygame.
                 if event.type == pygame.QUIT: #If the user closes the tab then pygame closes and the program exits
                     pygame.quit()
                     exit()
                 if event.type == pygame.KEYDOWN: #Runs when any key press event occurs
-                    if event.key in (pygame.K_SPACE, pygame.K_RETURN): #If the user clicks enter or return the loop stops and they can advance
-                        self.in_loop = False
-            current_menu = self.images[self.menu_image] if int(time.time() * 5) % 2 == 0 else self.images[self.menu_image + 1] #Switches between two similar frames of a menu image
-            screen.blit(current_menu, (0, 0)) #Draws the menu onto the screen
-            pygame.display.update() #Updates the display to show the changes
-            clock.tick(60)
+                    handle_key(event)
+                    shown_frame = None #Draws the screen again after a key press
+
+    def show_menu(self):
+        """
+        Shows 2 similar looking menu images which flicker between eachother at short intervals to imitate a draw or plaful effect for the
+        target audience. The self.images list is ordered in a way that the image that is similar to the other is the next index. Thus
+        self.images[self.menu_image] and self.images[self.menu_image + 1] is used.
+        """
+        self.animate((self.images[self.menu_image], self.images[self.menu_image + 1]), self.continue_key) #Switches between two similar frames of a menu image
+
+    def continue_key(self, event):
+        """
+        If the user clicks enter or return the loop stops and they can advance
+        """
+        if event.key in (pygame.K_SPACE, pygame.K_RETURN):
+            self.in_loop = False
 
     def ask_difficulty_and_debug(self):
         """
@@ -234,82 +688,57 @@ class Menu:
         This specific menu screen also handles the difficulty choice which affects the function which dictates the time, maze properties, and buff bonus.
         """
         #Initializes all the variables and objects needed
-        debug_sound = Audio()
-        clock = pygame.time.Clock()
-        self.in_loop = True
+        self.debug_sound = audio
         self.debug_mode = False
-
-        while self.in_loop:
-            for event in pygame.event.get(): #Gets all the input events in pygame.
-                if event.type == pygame.QUIT: #If the user closes the tab then pygame closes and the program exits
-                    pygame.quit()
-                    exit()
-                if event.type == pygame.KEYDOWN: #Runs when any key press event occurs
-                    if event.key == pygame.K_h: #When the player clicks h, hard difficulty is chosen
-                        self.choice = False
-                        self.in_loop = False
-                    if event.key == pygame.K_e: #When the player clicks e, easy difficulty is chosen
-                        self.choice = True
-                        self.in_loop = False
-                    if event.key == pygame.K_d: #When the player clicks d, debug mode is toggled on with two different sounds when toggled on or off
-                        if self.debug_mode == False:
-                            self.debug_mode = True
-                            debug_sound.play_win()
-                        elif self.debug_mode == True:
-                            self.debug_mode = False
-                            debug_sound.play_buff()
-
-            current_difficultymenu = self.images[9] if int(time.time() * 5) % 2 == 0 else self.images[10] #Draws the difficulty menu using the same method as the menus
-            screen.blit(current_difficultymenu, (0, 0))
-            pygame.display.update()
-            clock.tick(60)
+        self.animate((self.images[9], self.images[10]), self.difficulty_key) #Draws the difficulty menu using the same method as the menus
         return self.choice
+
+    def difficulty_key(self, event):
+        """
+        Handles the keys on the difficulty menu
+        """
+        if event.key == pygame.K_h: #When the player clicks h, hard difficulty is chosen
+            self.choice = False
+            self.in_loop = False
+        if event.key == pygame.K_e: #When the player clicks e, easy difficulty is chosen
+            self.choice = True
+            self.in_loop = False
+        if event.key == pygame.K_d: #When the player clicks d, debug mode is toggled on with two different sounds when toggled on or off
+            if self.debug_mode == False:
+                self.debug_mode = True
+                self.debug_sound.play_win()
+            elif self.debug_mode == True:
+                self.debug_mode = False
+                self.debug_sound.play_buff()
     
     def ask_yes_or_no(self, YNindex):
         """
         This is used for all the yes or no menu screens.
         """
-        clock = pygame.time.Clock()
-        self.in_loop = True
-        while self.in_loop:
-            for event in pygame.event.get(): #Gets all the input events in pygame.
-                if event.type == pygame.QUIT: #If the user closes the tab then pygame closes and the program exits
-                    pygame.quit()
-                    exit()
-                if event.type == pygame.KEYDOWN: #Runs when any key press event occurs
-                    if event.key == pygame.K_y: #The user inputs y for Yes
-                        self.choiceYN = True
-                        self.in_loop = False
-                    if event.key == pygame.K_n: #The user inputs n for No
-                        self.choiceYN = False
-                        self.in_loop = False
-
-            current_difficultymenu = self.images[YNindex] if int(time.time() * 5) % 2 == 0 else self.images[YNindex + 1] #The same method is used for drawing the the yes or no screens.
-            screen.blit(current_difficultymenu, (0, 0))
-            pygame.display.update()
-            clock.tick(60)
+        self.animate((self.images[YNindex], self.images[YNindex + 1]), self.yes_or_no_key) #The same method is used for drawing the the yes or no screens.
         return self.choiceYN
+
+    def yes_or_no_key(self, event):
+        """
+        Handles the keys on the yes or no menus
+        """
+        if event.key == pygame.K_y: #The user inputs y for Yes
+            self.choiceYN = True
+            self.in_loop = False
+        if event.key == pygame.K_n: #The user inputs n for No
+            self.choiceYN = False
+            self.in_loop = False
     
-    def show_high_scores(self, score_file):
+    def show_high_scores(self, scores, current_score):
         """
-        This method reads the scores.txt file and updates the top score if surpassed. It then draws the scores onto the score menu. This
-        screen also flicks between two similar images.
+        This method reads the top score from the score store. It then draws the current score and the top score onto the score menu.
+        The scores are drawn onto a copy of the menu image once, so the screen is only drawn again when a key is pressed.
         """
         # Load the high scores screen image (index 27)
         high_scores_image = self.images[27]
 
-        # Read scores from the text file
-        try:
-            with open(score_file, "r") as file:
-                lines = file.readlines()
-                current_score = lines[0].strip()  # First line: Current score
-                top_score = lines[1].strip()      # Second line: Top score
-                file.close()
-                error = False
-        except (FileNotFoundError, IndexError):
-            # Handle missing file or insufficient lines in the file
-            current_score = "0"
-            top_score = "0"
+        # Read the top score (which includes the current score since it has already been saved)
+        top_score = scores.top_score()
 
         # Set up the font
         font = pygame.font.Font(None, 100)  # Default font, size 50
@@ -318,28 +747,13 @@ class Menu:
         current_score_text = font.render(f"Current Score: {current_score}", True, (255, 255, 255))  # White color
         top_score_text = font.render(f"Top Score: {top_score}", True, (255, 255, 255))  # White color
 
-        # Display the high scores screen
-        clock = pygame.time.Clock()
-        self.in_loop = True
-        while self.in_loop:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    exit()
-                if event.type == pygame.KEYDOWN:
-                    if event.key in (pygame.K_SPACE, pygame.K_RETURN):
-                        self.in_loop = False  # Exit the high scores screen
-
-            # Blit the high scores image
-            screen.blit(high_scores_image, (0, 0))
-
-            # Blit the scores onto the screen
-            screen.blit(current_score_text, (100, 700))  # Position for current score
-            screen.blit(top_score_text, (100, 400))      # Position for top score
+        # Draw the scores onto the high scores image
+        scores_frame = high_scores_image.copy()
+        scores_frame.blit(current_score_text, (100, 700))  # Position for current score
+        scores_frame.blit(top_score_text, (100, 400))      # Position for top score
 
-            # Update the display
-            pygame.display.update()
-            clock.tick(60)
+        # Display the high scores screen (both frames are the same image)
+        self.animate((scores_frame, scores_frame), self.continue_key)
     
     def run_menu(self):
         """
@@ -356,7 +770,7 @@ class Menu:
                 self.menu_image = self.menu_image + 2
         return self.choice, self.debug_mode
     
-    def run_win_menu(self):
+    def run_win_menu(self, scores, current_score):
         """
         Utilizes the other previous methods to run the ending menu while asking the player if they would like to
         continue or not.
@@ -364,22 +778,181 @@ class Menu:
         ##23 24
         self.menu_image = 23 #Index for the win screen
         self.show_menu()
-        self.show_high_scores("scores.txt")
+        self.show_high_scores(scores, current_score)
         YNindex = 25 #Index for the continue screen
         self.choiceYN = self.ask_yes_or_no(YNindex)
         if self.choiceYN == False:
             pygame.quit()
             exit()
 
-class Maze:
+class Grid:
     """
-    Handles all the methods relating to mazes.
+    A compact grid of cells (1 = wall, 0 = path). The cells are stored in one bytearray, row after row, so cell (x, y) is
+    at index y * width + x. This uses one byte per cell instead of a list of lists (about 8 bytes per cell plus the lists).
+    grid[y][x] still works like it did with a list of lists: grid[y] is a memoryview of row y, which reads and writes
+    the bytearray directly. The cells can be shared with numpy or pygame without copying through memoryview() and to_numpy().
     """
-    def __init__(self, grid_size):
+    def __init__(self, width, height=None, data=None):
+        """
+        Creates a grid full of walls, or a grid that uses the bytes in data (a bytearray of width * height cells)
+        """
+        self.width = width
+        self.height = width if height is None else height
+        if data is None:
+            data = bytearray(b"\x01") * (self.width * self.height)
+        if len(data) != self.width * self.height:
+            raise ValueError(f"A {self.width}x{self.height} grid needs {self.width * self.height} cells, not {len(data)}")
+        self.data = data
+        view = memoryview(self.data)
+        self.rows = [view[y * self.width:(y + 1) * self.width] for y in range(self.height)] #One memoryview per row (no copying)
+
+    def __getitem__(self, y):
+        return self.rows[y]
+
+    def __len__(self):
+        return self.height
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def memoryview(self):
+        """
+        Returns a 2d (height, width) memoryview of the cells. numpy.asarray() can read it without copying.
+        """
+        return memoryview(self.data).cast("B", (self.height, self.width))
+
+    def to_numpy(self):
         """
-        Generates a grid using the maze generation method
+        Returns the cells as a numpy uint8 array of shape (height, width) that shares the memory of the grid
         """
-        self.grid = self.gen(grid_size)
+        if load_numpy() is None:
+            raise ImportError("to_numpy() needs numpy to be installed")
+        return np.frombuffer(self.data, dtype=np.uint8).reshape(self.height, self.width)
+
+    def tolist(self):
+        """
+        Returns the cells as a list of lists
+        """
+        return [list(row) for row in self.rows]
+
+class Maze:
+    """
+    Handles all the methods relating to mazes.
+    """
+    def __init__(self, grid_size, backend="python", seed=None, rng=None):
+        """
+        Generates a grid using the maze generation method. The backend picks which generator is used:
+        -"python": the original generator
+        -"numpy": the generator for very large mazes which uses numpy for the random numbers. The seed is used by this backend
+        -"eller": the row by row generator (eller_rows()) which only keeps one row of the maze in memory while it works
+        Both give a Grid (self.grid[y][x] reads a cell) so the rest of the game does not need to know which was used.
+        All the randomness of the maze (and of the entities placed in it) comes from rng, a random.Random which is
+        made from the seed if it is not given, so the same seed always gives the same maze.
+        """
+        self.rng = rng if rng is not None else random.Random(seed)
+        if backend == "python":
+            self.grid = self.gen(grid_size)
+        elif backend == "numpy":
+            self.grid = self.gen_numpy(grid_size, seed if seed is not None else self.rng.getrandbits(64))
+        elif backend == "eller":
+            self.grid = Maze.from_rows(self.eller_rows(grid_size, grid_size, self.rng), grid_size).grid
+        else:
+            raise ValueError(f"Unknown maze backend: {backend}")
+        self.index_cells(grid_size)
+        self.fields = {} #Dictionary of goal -> (distances, parents) so each goal is only searched once
+
+    @classmethod
+    def from_grid(cls, grid, rng=None):
+        """
+        Makes a maze from a grid that already exists (such as one read from a level pack) instead of generating one
+        """
+        maze = cls.__new__(cls)
+        maze.rng = rng if rng is not None else random.Random()
+        maze.grid = grid
+        maze.index_cells(grid.width)
+        maze.fields = {}
+        return maze
+
+    @classmethod
+    def from_rows(cls, rows, grid_size, rng=None):
+        """
+        Makes a maze from rows of cells (bytes of 0s and 1s, such as the rows yielded by eller_rows()).
+        There must be grid_size rows of grid_size cells.
+        """
+        cells = bytearray()
+        for row in rows:
+            if len(row) != grid_size:
+                raise ValueError(f"A row of a {grid_size}x{grid_size} maze needs {grid_size} cells, not {len(row)}")
+            cells += row
+        return cls.from_grid(Grid(grid_size, data=cells), rng)
+
+    @staticmethod
+    def eller_rows(width, height, rng=None):
+        """
+        Creates a maze one row at a time using Eller's algorithm and yields each row (bytes of 1 = wall, 0 = path, the
+        same as the rows of a Grid) as soon as it is finished. Only the current row is kept, so the memory used depends
+        on the width and not the height, and very tall mazes can be written straight to a file or a scrolling level:
+
+        for row in Maze.eller_rows(width, height, rng):
+            file.write(row)
+
+        The rooms are the cells with even x and y and the walls between them are the cells in between, like the mazes
+        from gen(). Every room in the current row has a set number, and rooms in the same set are already joined:
+        -neighbouring rooms in different sets are joined at random (all of them on the last row) and their sets merged
+        -every set goes down into the next row at least once, at random places
+        -rooms in the next row that nothing went down into start a new set
+        Two rooms are only joined when they are in different sets, so the maze is perfect (one path between any two cells).
+        """
+        if rng is None:
+            rng = random.Random()
+        columns = (width + 1) // 2 #Rooms across a row
+        room_rows = (height + 1) // 2
+        sets = list(range(columns)) #The set number of each room in the current row
+        members = {number: [number] for number in range(columns)} #Set number -> the rooms (columns) in that set
+        next_set = columns
+        for room_row in range(room_rows):
+            last = room_row == room_rows - 1
+            row = bytearray(b"\x01") * width
+            row[0::2] = bytes(columns) #Every room is a path
+            for column in range(columns - 1): #Joins neighbouring rooms from different sets
+                first, second = sets[column], sets[column + 1]
+                if first != second and (last or rng.random() < 0.5):
+                    row[column * 2 + 1] = 0 #Removes the wall between the two rooms
+                    if len(members[first]) < len(members[second]): #Moves the smaller set into the bigger one
+                        first, second = second, first
+                    for member in members[second]:
+                        sets[member] = first
+                    members[first].extend(members.pop(second))
+            yield bytes(row)
+            if room_row * 2 + 1 >= height: #The maze has an odd height so it ends on a row of rooms
+                break
+            below = bytearray(b"\x01") * width #The row between this row of rooms and the next
+            if not last:
+                next_sets = [-1] * columns
+                for number, rooms in members.items(): #Every set goes down at least once
+                    down = [room for room in rooms if rng.random() < 0.5]
+                    if not down:
+                        down = [rng.choice(rooms)]
+                    for room in down:
+                        below[room * 2] = 0
+                        next_sets[room] = number
+                members = {}
+                for column in range(columns): #Rooms that nothing went down into start their own set
+                    if next_sets[column] == -1:
+                        next_sets[column] = next_set
+                        next_set = next_set + 1
+                    members.setdefault(next_sets[column], []).append(column)
+                sets = next_sets
+            yield bytes(below)
+
+    def index_cells(self, grid_size):
+        """
+        Makes the index of every open (path) cell used to place entities. This is done once after the maze is generated.
+        self.cells is the grid's own bytearray (one byte per cell, row after row) which the searches read directly.
+        """
+        self.cells = self.grid.data
+        open_mask = self.cells.translate(bytes.maketrans(b"\x00\x01", b"\x01\x00")) #1 for every path cell, 0 for every wall
+        self.open_cells = array("i", itertools.compress(range(grid_size * grid_size), open_mask)) #Flat indexes of the path cells
 
     def gen(self, grid_size):
         """
@@ -393,20 +966,21 @@ class Maze:
         """
         stack = [] #Stack to keep track of the current path in the DFS
         visited = set() #Set to keep track of the visited cells
-        maze = [[1] * grid_size for _ in range(grid_size)] #Initializes the grid with walls (image 1)
+        maze = Grid(grid_size) #Initializes the grid with walls (image 1)
 
         #Starting at a random position
-        start_x = random.randint(0, grid_size - 1)
-        start_y = random.randint(0, grid_size - 1)
+        start_x = self.rng.randint(0, grid_size - 1)
+        start_y = self.rng.randint(0, grid_size - 1)
         stack.append((start_x, start_y))
         visited.add((start_x, start_y))
         maze[start_y][start_x] = 0 #Starting cell becomes a path (image 0)
 
         while stack:
             x, y = stack[-1] #Fetch current cell
-            random.shuffle(directions) #randomizes the direction 
+            order = directions[:] #Copy of the directions so the module-global list is never shuffled
+            self.rng.shuffle(order) #randomizes the direction 
             moved = False
-            for directionx, directiony in directions: #Attempt to go to neighbour cell
+            for directionx, directiony in order: #Attempt to go to neighbour cell
                 neighbourx, neighboury = x + directionx * 2, y + directiony * 2
                 if 0 <= neighbourx < grid_size and 0 <= neighboury < grid_size and (neighbourx, neighboury) not in visited: #Check if neighbour is within bounds and isnt visited
                     #Create a path to the neighbour by setting cells as path (image 0)
@@ -420,53 +994,130 @@ class Maze:
             if not moved: #If moving isnt possible then backtrack
                 stack.pop()
         return maze
+
+    def gen_numpy(self, grid_size, seed=None):
+        """
+        Creates the same kind of maze as gen() (Depth First Search with a random start) but for grids up to 2000x2000.
+        The grid is one flat block of bytes which is carved directly (grid.to_numpy() views it as a numpy array). A carved cell is
+        also the visited marker so no visited set is needed, and the stack is an array of flat cell indexes. The random
+        direction orders are drawn from the seeded generator in large vectorized batches instead of one shuffle per step.
+        The module-global directions list is not touched.
+        """
+        if load_numpy() is None:
+            raise ImportError("The numpy maze backend needs numpy to be installed")
+        rng = np.random.default_rng(seed)
+        orders = list(itertools.permutations(((0, 1), (1, 0), (0, -1), (-1, 0)))) #All 24 orders the directions can be tried in
+        cells = bytearray(b"\x01") * (grid_size * grid_size) #Flat grid of walls (1), row after row
+        stack = array("i") #Stack of flat cell indexes (y * grid_size + x)
+        choices = [] #Batch of random direction orders
+
+        #Starting at a random position
+        start_x, start_y = (int(value) for value in rng.integers(0, grid_size, size=2))
+        stack.append(start_y * grid_size + start_x)
+        cells[start_y * grid_size + start_x] = 0 #Starting cell becomes a path (0) which also marks it as visited
+
+        while stack:
+            if not choices:
+                choices = rng.integers(0, len(orders), size=65536).tolist() #Refills the batch of random direction orders
+            current = stack[-1] #Fetch current cell
+            y, x = divmod(current, grid_size)
+            for directionx, directiony in orders[choices.pop()]: #Attempt to go to neighbour cell
+                neighbourx, neighboury = x + directionx * 2, y + directiony * 2
+                if 0 <= neighbourx < grid_size and 0 <= neighboury < grid_size:
+                    neighbour = neighboury * grid_size + neighbourx
+                    if cells[neighbour] == 1: #A wall here means the neighbour has not been visited
+                        cells[neighbour] = 0
+                        cells[current + directiony * grid_size + directionx] = 0 #Removes the wall between the two cells
+                        stack.append(neighbour)
+                        break
+            else: #If moving isnt possible then backtrack
+                stack.pop()
+        return Grid(grid_size, data=cells)
     
     def randfreespot(self, *excluded, grid_size):
         """
         finds a random free spot that isnt in the excluded set and isnt a wall
         """
-        excluded_set = set(excluded)
-        free_spots = [
-            (x, y)
-            for y in range(grid_size) 
-            for x in range(grid_size) 
-            if self.grid[y][x] == 0 and (x, y) not in excluded_set
-        ]
-        return random.choice(free_spots)
+        return self.sample_free_spots(1, set(excluded), grid_size)[0]
+
+    def sample_free_spots(self, count, excluded, grid_size):
+        """
+        Picks count different random free spots that are not in excluded (a set of (x, y) positions). The open cell index
+        is shuffled lazily (a Fisher-Yates shuffle that only remembers the swapped positions in a dictionary) so each pick
+        costs the same no matter how big the maze is. Picks that land on an excluded spot are skipped.
+        The picks come from the maze's own random number generator.
+        """
+        open_cells = self.open_cells
+        swapped = {} #Position in open_cells -> the position whose cell has been swapped there
+        spots = []
+        drawn = 0 #open_cells[:drawn] (after the swaps) have already been picked
+        while len(spots) < count:
+            if drawn == len(open_cells):
+                raise IndexError("There are not enough free spots in the maze")
+            pick = self.rng.randrange(drawn, len(open_cells))
+            cell = open_cells[swapped.get(pick, pick)]
+            swapped[pick] = swapped.get(drawn, drawn) #Moves the cell that was not picked into the picked cell's place
+            drawn = drawn + 1
+            spot = (cell % grid_size, cell // grid_size)
+            if spot not in excluded:
+                spots.append(spot)
+        return spots
 
     def solve(self, start, goal, grid_size):
         """
-        Solves the maze using Dijkstra's shortest path algorithm. The algorithm determines
-        the shortest path between the starting position and the goals position.
-        """
-        priorityqueue = [] #Stores cells with their weightage (distance)
-        heapq.heappush(priorityqueue, (0, start)) #Push the starting position as 0
-        distances = {start: 0} #Dictionary which stores the shortest distance to each cell
-        previous = {} #Disctionary that stores the previous cell int he shortest path
-
-        while priorityqueue:
-            current_dist, current = heapq.heappop(priorityqueue) #Fetch the cell with the smallest weight (distance)
-            
-            #When the goal is reached, reconstruct the path
-            if current == goal:
-                path = []
-                while current in previous:
-                    path.append(current)
-                    current = previous[current]
-                return path[::-1] #Reverses the path so its from start position to goal position
-
-            x, y = current #Current cell position
-
-            #Visit neighbour cells
-            for dx, dy in directions:
-                nx, ny = x + dx, y + dy #Position of neighbouring cells
-                if 0 <= nx < grid_size and 0 <= ny < grid_size and self.grid[ny][nx] == 0: #Check if neighbour is in the bounds and is a path
-                    new_dist = current_dist + 1 #Calculate new distance
-                    if (nx, ny) not in distances or new_dist < distances[(nx, ny)]: #Check if neighbour cell has not been visited or the shortest path is determined
-                        distances[(nx, ny)] = new_dist #Update weight (distance)
-                        heapq.heappush(priorityqueue, (new_dist, (nx, ny))) #Add neighbour to priority queue
-                        previous[(nx, ny)] = current #Update previous cell
-        return [] #If no path found then empty list is returned
+        Finds the shortest path between the starting position and the goals position. Every step in the maze
+        costs the same so a Breadth First Search finds the shortest path (the same result as Dijkstra's algorithm
+        without the priority queue). The search is done once from the goal and kept, so solving again from any
+        start position only follows the parent pointers back to the goal.
+        The path does not include the start position but does include the goal.
+        """
+        distances, parents = self.distance_field(goal, grid_size)
+        current = start[1] * grid_size + start[0]
+        target = goal[1] * grid_size + goal[0]
+        if distances[current] == -1: #If no path found then empty list is returned
+            return []
+        path = []
+        while current != target: #Each parent is one step closer to the goal
+            current = parents[current]
+            path.append((current % grid_size, current // grid_size))
+        return path
+
+    def distance_field(self, goal, grid_size):
+        """
+        Runs a Breadth First Search out from the goal over the whole maze. Cells are stored as flat
+        indexes (y * grid_size + x) in 4 byte integer arrays instead of dictionaries of tuples.
+        distances[i] is the number of steps from cell i to the goal (-1 if the goal cannot be reached)
+        parents[i] is the next cell on the shortest path from cell i to the goal
+        """
+        if goal in self.fields:
+            return self.fields[goal]
+        cells = self.cells
+        cell_count = grid_size * grid_size
+        distances = array("i", [-1]) * cell_count
+        parents = array("i", [-1]) * cell_count
+        target = goal[1] * grid_size + goal[0]
+        if cells[target] == 0: #A goal inside a wall cannot be reached from anywhere
+            distances[target] = 0
+            queue = [target] #Cells waiting to be visited. head is the front of the queue
+            head = 0
+            while head < len(queue):
+                current = queue[head] #Fetch the next cell in the order they were found
+                head = head + 1
+                distance = distances[current] + 1
+                x = current % grid_size
+                #Visit the neighbour cells (above, below, left, right) that are paths and have not been reached yet
+                for neighbour, inside in (
+                    (current - grid_size, current >= grid_size),
+                    (current + grid_size, current < cell_count - grid_size),
+                    (current - 1, x > 0),
+                    (current + 1, x < grid_size - 1),
+                ):
+                    if inside and cells[neighbour] == 0 and distances[neighbour] == -1:
+                        distances[neighbour] = distance
+                        parents[neighbour] = current
+                        queue.append(neighbour)
+        self.fields[goal] = (distances, parents)
+        return distances, parents
     
 class Difficulty:
     """
@@ -529,15 +1180,40 @@ class Difficulty:
         time_multiplier_hard = 0.1
         return time_addition_easy, time_addition_hard, time_multiplier_easy, time_multiplier_hard, pathcount
     
+class CameraDifficulty(Difficulty):
+    """
+    The difficulty used when the camera follows the player. The mazes grow in the same way (multiplied by the map scale
+    for bigger maps) but the cells are never smaller than camera_cell_size, so big mazes are larger than the screen
+    and only the part around the player is shown.
+    """
+    def __init__(self, choice, map_scale=1):
+        """
+        Initializes the grid sizes of the difficulty and the map scale
+        """
+        super().__init__(choice)
+        if map_scale < 1:
+            raise ValueError(f"The map scale must be at least 1, not {map_scale}")
+        self.map_scale = map_scale
+
+    def set_values(self, wins):
+        """
+        Returns the grid size multiplied by the map scale and a cell size that stays readable
+        """
+        grid_size, _ = super().set_values(wins)
+        grid_size = grid_size * self.map_scale
+        return grid_size, max(camera_cell_size, math.floor(841 / grid_size))
+
 class Entity:
     """
     Handles the entities in the maze
     """
-    def __init__(self, maze, *excluded, grid_size):
+    def __init__(self, maze, *excluded, grid_size, spot=None):
         """
-        Creates an entity in the maze
+        Creates an entity in the maze at a random free spot (picked with the maze's random number generator), or at the spot given
         """
-        self.x, self.y = maze.randfreespot(*excluded, grid_size=grid_size)
+        if spot is None:
+            spot = maze.randfreespot(*excluded, grid_size=grid_size)
+        self.x, self.y = spot
         self.shortest_path = []
 
     def move(self, maze, dx, dy, grid_size):
@@ -548,6 +1224,564 @@ class Entity:
         if 0 <= nx < grid_size and 0 <= ny < grid_size and maze.grid[ny][nx] == 0: #Checks if the intended cell to mvoe into is in the range and isnt a wall
             self.x, self.y = nx, ny
 
+class ChasePlanner:
+    """
+    Keeps the path the enemy follows to chase the player. Every maze is a perfect maze (there is exactly one path
+    between any two cells) so the path never has to be searched again while the player walks around:
+    -if the player steps back onto the second last cell of the path, the last cell is removed
+    -if the player steps anywhere else, the new cell is added to the end
+    -when the enemy moves it takes the first cell of the path
+    Each of these only changes one end of the path so it costs the same however big the maze is. The path is only
+    searched for again (replan()) when the player jumps somewhere that is not next to where they were.
+    The path does not include the enemy's cell but does include the player's cell, like Maze.solve().
+    """
+    def __init__(self, maze, enemy, player, grid_size):
+        """
+        Finds the first path from the enemy to the player
+        """
+        self.maze = maze
+        self.enemy = enemy
+        self.grid_size = grid_size
+        self.replan(player.x, player.y)
+
+    def replan(self, x, y):
+        """
+        Searches for the whole path from the enemy to the player at (x, y). This is a Breadth First Search from the
+        enemy which stops as soon as it reaches the player, and it is not kept in the maze's cache of distance fields.
+        """
+        grid_size = self.grid_size
+        cells = self.maze.cells
+        start = self.enemy.y * grid_size + self.enemy.x
+        target = y * grid_size + x
+        parents = {start: -1} #Cell -> the cell it was reached from
+        queue = deque([start])
+        while queue and target not in parents:
+            current = queue.popleft()
+            column = current % grid_size
+            for neighbour, inside in (
+                (current - grid_size, current >= grid_size),
+                (current + grid_size, current < len(cells) - grid_size),
+                (current - 1, column > 0),
+                (current + 1, column < grid_size - 1),
+            ):
+                if inside and cells[neighbour] == 0 and neighbour not in parents:
+                    parents[neighbour] = current
+                    queue.append(neighbour)
+        self.path = deque()
+        current = target if target in parents else start #An unreachable player gives an empty path
+        while current != start: #Follows the parents back from the player to the enemy
+            self.path.appendleft((current % grid_size, current // grid_size))
+            current = parents[current]
+        self.last = (x, y)
+
+    def follow(self, x, y):
+        """
+        Updates the path after the player has moved to (x, y). The player can move in two directions in one tick
+        so a diagonal move is followed through the open cell between the two positions.
+        """
+        last_x, last_y = self.last
+        steps = abs(x - last_x) + abs(y - last_y)
+        if steps == 0:
+            return
+        if steps == 1:
+            self.step_to(x, y)
+        elif steps == 2 and x != last_x and y != last_y:
+            if self.maze.grid[last_y][x] == 0: #Only one of the two cells between can be open in a perfect maze
+                self.step_to(x, last_y)
+            else:
+                self.step_to(last_x, y)
+            self.step_to(x, y)
+        else: #The player jumped (for example a new level) so the path has to be searched for again
+            self.replan(x, y)
+
+    def step_to(self, x, y):
+        """
+        Updates the path for the player moving to the neighbouring cell (x, y)
+        """
+        previous = self.path[-2] if len(self.path) >= 2 else (self.enemy.x, self.enemy.y)
+        if self.path and (x, y) == previous: #The player went back the way the path came
+            self.path.pop()
+        else:
+            self.path.append((x, y))
+        self.last = (x, y)
+
+    def step(self):
+        """
+        Moves the enemy one cell along the path. Returns True if the enemy moved.
+        """
+        if not self.path: #The enemy is already on the player
+            return False
+        self.enemy.x, self.enemy.y = self.path.popleft()
+        return True
+
+class Level:
+    """
+    Holds everything that makes up one level: the images, maze, entities, shortest path and time limit.
+    A level only depends on the difficulty and the wins so it can be built before the player reaches it.
+    """
+    def __init__(self, difficulty, difficultychoice, wins, load_images=True, seed=None):
+        """
+        Builds the level for the amount of wins. The images are not needed (or loaded) when the game runs headless.
+        Everything random in the level comes from its own random number generator made from the seed, so the same
+        seed always gives the same level (a random seed is picked if none is given).
+        """
+        self.difficulty = difficulty
+        self.difficultychoice = difficultychoice
+        self.wins = wins
+        self.load_images = load_images
+        self.seed = seed if seed is not None else random.randrange(2 ** 63) #The seed the level was made from
+        self.rng = random.Random(self.seed)
+        self.grid_size, self.cell_size, = self.difficulty.set_values(self.wins)
+        self.reset_values()
+        with profiler.phase("level.buffs"):
+            self.handle_buff_count()
+
+    def load_assets(self):
+        """
+        Loads the images scaled for the level
+        """
+        self.images_instance = Load()
+        self.images = self.images_instance.images(self.cell_size, screen_size) #The menus fill the screen whatever the size of the level
+
+    def handle_buff_count(self):
+        """
+        Handles the generation of buffs based on the wins 
+        """
+        count = 0
+        count = count + 1
+        if self.wins > 4: #Adds an extra buff past 5 wins
+            count = count + 1
+        wincount = self.wins // 10
+        if wincount >= 1 and wincount <= 5: #Increments the count for every 10 wins 
+            count = count + wincount
+        elif wincount > 5:
+            count = count + 5
+        excluded = {(self.player.x, self.player.y), (self.Goal.x, self.Goal.y), *self.shortestpath} #Made once for all the buffs
+        for spot in self.maze.sample_free_spots(count, excluded, self.grid_size): #Creates a new buff for every count that accumulated in the previous statements
+            new_buff = Entity(self.maze, grid_size=self.grid_size, spot=spot)
+            self.Buffs.append(new_buff)
+        self.max_time = self.difficulty.scale_time(self.wins, self.difficultychoice, self.shortestpath)
+
+    def reset_values(self):
+        """
+        Creates the level's values.
+        """
+        self.images = None
+        if self.load_images == True:
+            with profiler.phase("level.assets"):
+                self.load_assets()
+        with profiler.phase("level.generate"):
+            self.maze = Maze(self.grid_size, rng=self.rng)
+        with profiler.phase("level.entities"):
+            self.player = Entity(self.maze, grid_size=self.grid_size)
+            self.Goal = Entity(self.maze, (self.player.x, self.player.y), grid_size=self.grid_size)
+            self.Buffs = []
+            self.enemy = Entity(self.maze, (self.player.x, self.player.y), (self.Goal.x, self.Goal.y), grid_size=self.grid_size)
+            self.enemy.x, self.enemy.y = self.player.x, self.player.y
+        with profiler.phase("level.solve"):
+            self.shortestpath = self.maze.solve((self.enemy.x, self.enemy.y), (self.Goal.x, self.Goal.y), self.grid_size)
+
+class LevelPipeline:
+    """
+    Builds the next level on a background thread while the current level is being played so that
+    moving on to it is instant. Only one level is built ahead at a time. When background is False
+    (the headless simulation) every level is built on the spot instead. If a level pack is given, levels
+    in the pack are used instead of generating new ones.
+    """
+    def __init__(self, difficulty, difficultychoice, load_images=True, background=True, pack=None):
+        """
+        Initialize the worker thread and the empty prefetch slot
+        """
+        self.difficulty = difficulty
+        self.difficultychoice = difficultychoice
+        self.load_images = load_images
+        self.pack = pack
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level") if background else None
+        self.future = None #The level being built in the background
+        self.future_key = None #The (wins, seed) the level in the background is being built for
+
+    def prefetch(self, wins, seed=None):
+        """
+        Starts building the level for the wins and seed in the background. A level already being built for
+        the same wins and seed is kept, and one for anything else is thrown away.
+        """
+        if self.executor is None or (self.future is not None and self.future_key == (wins, seed)) or self.pack_levels(wins):
+            return
+        self.discard()
+        self.future_key = (wins, seed)
+        self.future = self.executor.submit(Level, self.difficulty, self.difficultychoice, wins, self.load_images, seed)
+
+    def discard(self):
+        """
+        Throws away the level being built in the background
+        """
+        if self.future is not None:
+            self.future.cancel() #Stops it if it has not started yet. Otherwise the finished level is ignored
+        self.future = None
+        self.future_key = None
+
+    def take(self, wins, seed=None):
+        """
+        Returns the level for the wins and seed. The background level is used if it is finished and was built for these,
+        otherwise the level is built on the spot instead of waiting (a prefetched level for anything else is left alone).
+        The seed also picks the level from the level pack.
+        """
+        pack_levels = self.pack_levels(wins)
+        if pack_levels:
+            level = self.pack[pack_levels[seed % len(pack_levels)] if seed is not None else random.choice(pack_levels)]
+            if self.load_images == True:
+                level.load_assets()
+            return level
+        if self.future is not None and self.future_key == (wins, seed) and self.future.done():
+            future = self.future
+            self.future = None
+            self.future_key = None
+            if future.exception() is None:
+                return future.result()
+            print(f"Building the next level in the background failed: {future.exception()}") #Falls back to building it now
+        elif self.future_key == (wins, seed):
+            self.discard() #Still being built so it is quicker to build it here than wait for it
+        return Level(self.difficulty, self.difficultychoice, wins, self.load_images, seed)
+
+    def pack_levels(self, wins):
+        """
+        Returns the indexes of the levels in the level pack for the difficulty and wins
+        """
+        if self.pack is None:
+            return []
+        return self.pack.find(self.difficultychoice, wins)
+
+class FieldParents:
+    """
+    Works out the parents of a distance field from the distances alone, so a saved distance field does not need its
+    parents saved as well. The parent of a cell is the neighbour that is one step closer to the goal.
+    """
+    def __init__(self, distances, cells, grid_size):
+        self.distances = distances
+        self.cells = cells
+        self.grid_size = grid_size
+
+    def __getitem__(self, current):
+        distance = self.distances[current]
+        if distance <= 0: #The goal and cells that cannot reach the goal have no parent
+            return -1
+        x = current % self.grid_size
+        for neighbour, inside in (
+            (current - self.grid_size, current >= self.grid_size),
+            (current + self.grid_size, current < len(self.cells) - self.grid_size),
+            (current - 1, x > 0),
+            (current + 1, x < self.grid_size - 1),
+        ):
+            if inside and self.cells[neighbour] == 0 and self.distances[neighbour] == distance - 1:
+                return neighbour
+        return -1
+
+#Binary level pack format (little-endian). A pack is a header, the level records, then an index of the records.
+#Header: magic, version, level count, offset of the index
+#Index entry (one per level): offset of the record, wins, difficulty (1 = easy, 0 = hard)
+#Record: the values below, the buffs (x, y each), the grid as a bitmap (1 bit per cell, 1 = wall) and the distance
+#field from the goal (a 4 byte integer per cell, -1 if the cell cannot reach the goal). The bitmap and field start
+#on a 4 byte boundary and every record starts on an 8 byte boundary.
+pack_magic = b"NEALEVEL"
+pack_version = 1
+pack_header = struct.Struct("<8sIIQ")
+pack_index_entry = struct.Struct("<QIB3x")
+pack_record = struct.Struct("<HHBBIQdHHHHHHH") #grid size, cell size, difficulty, flags, wins, seed, max time, player, goal, enemy, buff count
+pack_has_seed = 1 #Record flag: the seed value is used
+pack_has_field = 2 #Record flag: the distance field is stored
+bit_unpack_table = [bytes((byte >> bit) & 1 for bit in range(8)) for byte in range(256)] #Byte of the bitmap -> 8 cells
+bit_pack_table = {cells: byte for byte, cells in enumerate(bit_unpack_table)} #8 cells -> byte of the bitmap
+
+def pad_to(offset, size):
+    """
+    Returns the amount of padding needed to move offset onto a multiple of size
+    """
+    return (size - offset % size) % size
+
+def encode_level(level):
+    """
+    Turns a level into its record in the level pack format
+    """
+    grid_size = level.grid_size
+    distances, _ = level.maze.distance_field((level.Goal.x, level.Goal.y), grid_size)
+    flags = pack_has_field | (pack_has_seed if level.seed is not None else 0)
+    record = [pack_record.pack(
+        grid_size, level.cell_size, 1 if level.difficultychoice else 0, flags, level.wins,
+        level.seed if level.seed is not None else 0, level.max_time,
+        level.player.x, level.player.y, level.Goal.x, level.Goal.y, level.enemy.x, level.enemy.y, len(level.Buffs),
+    )]
+    record.extend(struct.pack("<HH", Buff.x, Buff.y) for Buff in level.Buffs)
+    size = pack_record.size + 4 * len(level.Buffs)
+    cells = bytes(level.maze.cells) + b"\x00" * pad_to(len(level.maze.cells), 8)
+    bitmap = bytes(bit_pack_table[cells[i:i + 8]] for i in range(0, len(cells), 8))
+    record.append(b"\x00" * pad_to(size, 4))
+    record.append(bitmap)
+    size = size + pad_to(size, 4) + len(bitmap)
+    record.append(b"\x00" * pad_to(size, 4))
+    record.append(array("i", distances).tobytes())
+    return b"".join(record)
+
+class LevelPackWriter:
+    """
+    Writes levels into a level pack file one at a time, so the levels do not all need to be kept in memory.
+    The index and header are written by close() (or at the end of a with block).
+    """
+    def __init__(self, path):
+        """
+        Creates the file and leaves space for the header
+        """
+        self.file = open(path, "wb")
+        self.file.write(pack_header.pack(pack_magic, pack_version, 0, 0))
+        self.index = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, level):
+        """
+        Adds a level to the pack
+        """
+        self.add_record(encode_level(level), level.wins, level.difficultychoice)
+
+    def add_record(self, record, wins, difficultychoice):
+        """
+        Adds a level that has already been turned into a record by encode_level() (for example by another process)
+        """
+        self.file.write(b"\x00" * pad_to(self.file.tell(), 8))
+        self.index.append((self.file.tell(), wins, 1 if difficultychoice else 0))
+        self.file.write(record)
+
+    def close(self):
+        """
+        Writes the index and then the header so the pack can be read
+        """
+        if self.file.closed:
+            return
+        self.file.write(b"\x00" * pad_to(self.file.tell(), 8))
+        index_offset = self.file.tell()
+        self.file.write(b"".join(pack_index_entry.pack(*entry) for entry in self.index))
+        self.file.seek(0)
+        self.file.write(pack_header.pack(pack_magic, pack_version, len(self.index), index_offset))
+        self.file.close()
+
+class LevelPack:
+    """
+    Reads a level pack file by memory mapping it. Nothing is read until a level is asked for, and then only
+    the pages of the file that hold that level are read. The distance field of a level is used straight from the
+    file without copying it (until the pack is closed, see close()).
+    """
+    def __init__(self, path):
+        """
+        Opens and memory maps the pack and checks its header
+        """
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self.index_offset = pack_header.unpack_from(self.map, 0)
+        if magic != pack_magic or version != pack_version:
+            raise ValueError(f"{path} is not a version {pack_version} level pack")
+        self.buckets = None #Dictionary of (difficultychoice, wins) -> level numbers, made the first time it is needed
+        self.mapped_mazes = weakref.WeakSet() #Mazes read from the pack whose distance field is still read from the file
+        self.digest = None #Hash of the file, made the first time fingerprint() is called
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, number):
+        """
+        Returns the level with the number as a Level (without images)
+        """
+        if not 0 <= number < self.count:
+            raise IndexError(f"The pack has no level {number}")
+        offset, _, _ = pack_index_entry.unpack_from(self.map, self.index_offset + number * pack_index_entry.size)
+        return self.read_level(offset)
+
+    def fingerprint(self):
+        """
+        Returns 8 bytes that identify the contents of the pack (a BLAKE2 hash of the whole file), so a recording can
+        check it is replayed with the pack it was recorded with. The hash is only worked out the first time.
+        """
+        if self.digest is None:
+            self.digest = hashlib.blake2b(self.map, digest_size=8).digest()
+        return self.digest
+
+    def find(self, difficultychoice, wins):
+        """
+        Returns the numbers of the levels in the pack for the difficulty and wins
+        """
+        if self.buckets is None:
+            self.buckets = {}
+            for number in range(self.count):
+                _, level_wins, difficulty = pack_index_entry.unpack_from(self.map, self.index_offset + number * pack_index_entry.size)
+                self.buckets.setdefault((difficulty == 1, level_wins), []).append(number)
+        return self.buckets.get((difficultychoice == True, wins), [])
+
+    def read_level(self, offset):
+        """
+        Rebuilds the level stored at the offset
+        """
+        (grid_size, cell_size, difficulty, flags, wins, seed, max_time,
+            player_x, player_y, goal_x, goal_y, enemy_x, enemy_y, buff_count) = pack_record.unpack_from(self.map, offset)
+        position = offset + pack_record.size
+        buffs = [struct.unpack_from("<HH", self.map, position + 4 * number) for number in range(buff_count)]
+        position = position + 4 * buff_count
+        position = position + pad_to(position, 4)
+        cell_count = grid_size * grid_size
+        bitmap_size = (cell_count + 7) // 8
+        cells = bytearray(b"".join(bit_unpack_table[byte] for byte in self.map[position:position + bitmap_size]))
+        del cells[cell_count:] #Removes the padding of the last byte
+        position = position + bitmap_size
+        position = position + pad_to(position, 4)
+
+        level = Level.__new__(Level) #The level is filled in from the record instead of being generated
+        level.difficultychoice = difficulty == 1
+        level.difficulty = Difficulty(level.difficultychoice)
+        level.wins = wins
+        level.load_images = False
+        level.images = None
+        level.seed = seed if flags & pack_has_seed else None
+        level.rng = random.Random(level.seed)
+        level.grid_size, level.cell_size = grid_size, cell_size
+        level.max_time = max_time
+        level.maze = Maze.from_grid(Grid(grid_size, data=cells), level.rng)
+        if flags & pack_has_field:
+            distances = memoryview(self.map)[position:position + 4 * cell_count].cast("i") #Read straight from the file
+            level.maze.fields[(goal_x, goal_y)] = (distances, FieldParents(distances, level.maze.cells, grid_size))
+            self.mapped_mazes.add(level.maze)
+        level.player = Entity(level.maze, grid_size=grid_size, spot=(player_x, player_y))
+        level.Goal = Entity(level.maze, grid_size=grid_size, spot=(goal_x, goal_y))
+        level.enemy = Entity(level.maze, grid_size=grid_size, spot=(enemy_x, enemy_y))
+        level.Buffs = [Entity(level.maze, grid_size=grid_size, spot=spot) for spot in buffs]
+        level.shortestpath = level.maze.solve((enemy_x, enemy_y), (goal_x, goal_y), grid_size)
+        return level
+
+    def close(self):
+        """
+        Closes the memory map and the file. The distance fields of the levels read from the pack that are still in use
+        are copied out of the file first (the memory map cannot be closed while they point into it), so those levels
+        keep working after the pack is closed.
+        """
+        for maze in list(self.mapped_mazes):
+            for goal, (distances, parents) in list(maze.fields.items()):
+                if isinstance(distances, memoryview):
+                    copied = array("i", distances)
+                    parents.distances = copied
+                    maze.fields[goal] = (copied, parents)
+                    distances.release() #Lets go of the file so the memory map can be closed
+        self.mapped_mazes.clear()
+        self.map.close()
+        self.file.close()
+
+class Phase:
+    """
+    Times one phase of the game for the profiler (used in a with block)
+    """
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+class Profiler:
+    """
+    Measures how long each phase of the game takes, such as the input, rendering and the steps of building a level.
+    The last window times of every phase are kept so the 50th, 95th and 99th percentiles can be shown on the
+    debug overlay and saved to a JSON file every few seconds. When the profiler is disabled phase() gives the
+    same empty context manager every time so timing costs almost nothing.
+    """
+    def __init__(self, window=600, dump_interval=10):
+        """
+        Starts disabled. The window is the number of times kept for each phase and the dump interval is in seconds.
+        """
+        self.enabled = False
+        self.window = window
+        self.dump_interval = dump_interval
+        self.dump_path = None #JSON file the percentiles are saved to (nothing is saved if this is None)
+        self.next_dump = 0
+        self.samples = {} #Dictionary of phase name -> deque of its last times in seconds
+        self.font = None
+        self.disabled_phase = nullcontext() #Shared by every phase while the profiler is disabled
+
+    def phase(self, name):
+        """
+        Returns a context manager which times the code inside its with block as the named phase
+        """
+        if self.enabled == False:
+            return self.disabled_phase
+        return Phase(self, name)
+
+    def record(self, name, seconds):
+        """
+        Adds a time to a phase. Levels are built on another thread so this only uses operations that are safe across threads.
+        """
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples.setdefault(name, deque(maxlen=self.window))
+        samples.append(seconds)
+
+    def percentiles(self):
+        """
+        Returns a dictionary of phase name -> the count, 50th, 95th and 99th percentile and the maximum time in milliseconds
+        """
+        results = {}
+        for name, samples in sorted(list(self.samples.items())):
+            times = sorted(samples)
+            if not times:
+                continue
+            results[name] = {"count": len(times), "max_ms": times[-1] * 1000}
+            for percentile in (50, 95, 99):
+                rank = max(0, math.ceil(percentile / 100 * len(times)) - 1) #Nearest rank percentile
+                results[name][f"p{percentile}_ms"] = times[rank] * 1000
+        return results
+
+    def dump(self):
+        """
+        Saves the percentiles to the JSON file
+        """
+        if self.dump_path is None:
+            return
+        with open(self.dump_path, "w") as file:
+            json.dump({"time": time.time(), "phases": self.percentiles()}, file, indent=2)
+
+    def maybe_dump(self):
+        """
+        Saves the percentiles if the dump interval has passed since they were last saved
+        """
+        if self.enabled == False or self.dump_path is None or time.perf_counter() < self.next_dump:
+            return
+        self.next_dump = time.perf_counter() + self.dump_interval
+        self.dump()
+
+    def overlay(self):
+        """
+        Returns a surface with a table of the percentiles for the debug overlay
+        """
+        if self.font is None:
+            pygame.font.init()
+            self.font = pygame.font.Font(None, 22)
+        rows = [("phase", "p50 ms", "p95 ms", "p99 ms")]
+        for name, result in self.percentiles().items():
+            rows.append((name, f"{result['p50_ms']:.2f}", f"{result['p95_ms']:.2f}", f"{result['p99_ms']:.2f}"))
+        texts = [[self.font.render(cell, True, (255, 255, 255)) for cell in row] for row in rows]
+        widths = [max(row[column].get_width() for row in texts) + 12 for column in range(4)] #Width of each column
+        line_height = self.font.get_linesize()
+        overlay = pygame.Surface((sum(widths) + 4, line_height * len(texts) + 8))
+        overlay.fill((0, 0, 0))
+        for number, row in enumerate(texts):
+            right = 4 + widths[0]
+            overlay.blit(row[0], (4, 4 + line_height * number)) #The phase names are lined up on the left
+            for column in range(1, 4): #The times are lined up on the right of their column
+                right = right + widths[column]
+                overlay.blit(row[column], (right - 12 - row[column].get_width(), 4 + line_height * number))
+        return overlay
+
 class Input:
     """
     Handles all the inputs the user makes
@@ -557,23 +1791,47 @@ class Input:
         allows the methods to use the local variables from the Game class.
         """
         self.game = game
+        self.tapped = set() #Directions of the movement keys pressed since the last move, so quick taps are not missed
     
-    def hotkeys(self, images):
+    def hotkeys(self, images, events=None):
         """
         Handles the hotkeys the player can use and the case where they quit the program so they quit it gracefully.
+        The events are the ones the main loop has already waited for (all the waiting events are fetched if none are given).
+        Returns True if a movement key was pressed so the player can be moved straight away.
         """
-        for event in pygame.event.get(): #Gets all the events in pygame.
+        if events is None:
+            events = pygame.event.get() #Gets all the events in pygame.
+        movement_pressed = False
+        for event in events:
             if event.type == pygame.QUIT: #If the user closes the tab then pygame closes and the program exits
                 self.game.running = False
-            if event.type == pygame.KEYDOWN: #Runs when any key press event occurs
+            if event.type == pygame.KEYDOWN and self.game.losing == False: #Runs when any key press event occurs (key presses are ignored during the loss sequence)
+                self.game.dirty = True #A hotkey may have changed what is shown
+                if event.key in movement_keys:
+                    self.tapped.add(movement_keys[event.key])
+                    movement_pressed = True
                 if event.key == pygame.K_m: #Shows the menu again (able to re-acces the tutorial)
                     self.game.music.stop()
                     menu = Menu(self.game.images)
                     Menu.run_menu(menu)
-                    self.game.reset(images)  # Reset the current game state
+                    if self.game.recorder is not None: #The level after the menu starts when the menu is closed
+                        self.game.recorder.tick()
+                    self.game.reset(self.game.images)  # Reset the current game state
                     self.game.music.play_soundtrack()
                 if self.game.debug_mode == True: #Allows access to debug hotkeys
                     self.debug_hotkeys(event)
+                if self.game.recorder is not None and event.key in record_hotkeys: #Movement keys are recorded by the logic step instead
+                    self.game.recorder.record(record_hotkey | record_hotkeys.index(event.key))
+        return movement_pressed
+
+    def replay_key(self, key):
+        """
+        Repeats a hotkey press from a recording. The menu is not shown again, only the reset that happens after it.
+        """
+        if key == pygame.K_m:
+            self.game.reset(self.game.images)
+        if self.game.debug_mode == True:
+            self.debug_hotkeys(pygame.event.Event(pygame.KEYDOWN, key=key))
 
     def debug_hotkeys(self, event):
         """
@@ -589,15 +1847,17 @@ class Input:
         -i: Prints the enemy position
         -j: Prints the goal position
         -k: Prints the buff position(s)
+        -c: Toggles the enemy chasing the player
+        -p: Toggles the profiler overlay
         """
         if event.type == pygame.KEYDOWN: #Runs when any key press event occurs
             if event.key == pygame.K_r: #Resets the game state when pressing r
-                self.game.reset(images)
+                self.game.reset(self.game.images)
                 self.game.music.stop()
                 self.game.music.play_soundtrack()
             if event.key == pygame.K_t: #Shows the shortest path with a trail (This is toggleable) when pressing t
                     self.game.shortestpath = self.game.maze.solve(
-                        (self.game.enemy.x, self.game.enemy.y),
+                        self.game.start,
                         (self.game.Goal.x, self.game.Goal.y), 
                         self.game.grid_size,
                     )
@@ -605,11 +1865,15 @@ class Input:
                         self.game.show_trail = True
                     elif self.game.show_trail == True:
                         self.game.show_trail = False
+                    if not self.game.headless: #A replay has no background to draw the trail on
+                        self.game.build_scene() #Adds or removes the trail from the pre-drawn background
             if event.key == pygame.K_q: #Increments the wins by 1 when pressing q
                 self.game.wins = self.game.wins + 1
+                self.game.prefetch(self.game.wins + 1) #Throws away the level built for the old wins
             if event.key == pygame.K_e: #Decrements the wins by 1 when pressing e
                 if self.game.wins > 0:
                     self.game.wins = self.game.wins - 1
+                    self.game.prefetch(self.game.wins + 1)
             if event.key == pygame.K_y: #Increments the time by 10 when pressing y
                 self.game.time = self.game.time + 10
             if event.key == pygame.K_x: #Decrements the time by 10 when pressing x
@@ -638,20 +1902,49 @@ class Input:
                     print(f"Buff[{c}]: X = {buff.x} Y = {buff.y}")
                     print("-------------------------------------")
                 print("-_-_-_-_-_-_-_-_-_-_-_-_-_-_-_-_-_-_-")
+            if event.key == pygame.K_c: #Toggles the enemy chasing the player when pressing c
+                self.game.chase_enabled = not self.game.chase_enabled
+                self.game.next_chase_move = self.game.now() + chase_interval
+            if event.key == pygame.K_p: #Toggles the profiler overlay when pressing p
+                self.game.show_profile = not self.game.show_profile
+                if self.game.show_profile == True:
+                    profiler.enabled = True #Starts timing the phases if the profiler was not already on
+                self.game.full_redraw = True #Removes the overlay from the screen when it is turned off
     
     def handle_movement(self):
         """
-        Handles all the movement input from the player to allow them to travel in the maze
+        Handles all the movement input from the player to allow them to travel in the maze. A direction moves the player
+        if its key is held down or was tapped since the last move.
+        Returns the directions as a bitmask (record_left, record_right, record_up and record_down) for apply_movement().
         """
         keys = pygame.key.get_pressed() #Fetches all the key inputs
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]:
+        mask = 0
+        if keys[pygame.K_LEFT] or keys[pygame.K_a] or (-1, 0) in self.tapped:
+            mask = mask | record_left
+        if keys[pygame.K_RIGHT] or keys[pygame.K_d] or (1, 0) in self.tapped: 
+            mask = mask | record_right
+        if keys[pygame.K_UP] or keys[pygame.K_w] or (0, -1) in self.tapped:
+            mask = mask | record_up
+        if keys[pygame.K_DOWN] or keys[pygame.K_s] or (0, 1) in self.tapped:
+            mask = mask | record_down
+        self.tapped.clear()
+        return mask
+
+    def apply_movement(self, mask):
+        """
+        Moves the player in every direction in the bitmask, in the order left, right, up, down
+        """
+        start = (self.game.player.x, self.game.player.y)
+        if mask & record_left:
             self.game.player.move(self.game.maze, -1, 0, self.game.grid_size) #The player moves left
-        if keys[pygame.K_RIGHT] or keys[pygame.K_d]: 
+        if mask & record_right:
             self.game.player.move(self.game.maze, 1, 0, self.game.grid_size) #The player moves right
-        if keys[pygame.K_UP] or keys[pygame.K_w]:
+        if mask & record_up:
             self.game.player.move(self.game.maze, 0, -1, self.game.grid_size) #The player moves up
-        if keys[pygame.K_DOWN] or keys[pygame.K_s]:
+        if mask & record_down:
             self.game.player.move(self.game.maze, 0, 1, self.game.grid_size) #The player mvoes down
+        if (self.game.player.x, self.game.player.y) != start: #Only redraw when the player actually moved
+            self.game.dirty = True
         
 
 
@@ -659,23 +1952,49 @@ class Game:
     """
     Handles the main game loop and all the methods needed to run the program
     """
-    def __init__(self, images, difficultychoice, debug_mode):
+    def __init__(self, images, difficultychoice, debug_mode, headless=False, pack=None, seed=None, camera=False, map_scale=1, scores=None, player="player", recorder=None):
         """
-        Initialize all the local variables and instantiates some objects to use later
+        Initialize all the local variables and instantiates some objects to use later. A headless game has no
+        window, audio or menus and its clock only moves forward when step_clock() is called. If a level pack is
+        given, its levels are played instead of generating new ones whenever it has one for the wins.
+        Every level's seed is made from the game's seed, so the same game seed always gives the same levels.
+        With the camera on, the cells stay big enough to read and the screen follows the player around the maze.
+        The map scale makes every maze that many times wider and taller.
+        Finished games are saved in the score store under the player's name (scores.db next to this file unless another store is given).
+        If a recorder is given, every logic step and hotkey is written to it and the game runs on the recorder's clock.
         """
         self.images = images
         self.difficultychoice = difficultychoice
         self.debug_mode = debug_mode
-        self.difficulty = Difficulty(self.difficultychoice)
+        self.headless = headless
+        self.pack = pack
+        self.seed = seed if seed is not None else random.randrange(2 ** 63)
+        self.player_name = player
+        if scores is None and not self.headless:
+            scores = ScoreStore(os.path.join(base_dir, "scores.db"), legacy_file=os.path.join(base_dir, "scores.txt"))
+        self.scores = scores
+        self.levels_started = 0 #Levels started so far. Part of each level's seed so a retried level is a new maze
+        self.camera = camera
+        self.difficulty = CameraDifficulty(self.difficultychoice, map_scale) if self.camera else Difficulty(self.difficultychoice)
+        self.simulated_time = 0.0 #Seconds that have passed in a headless game
+        self.recorder = recorder
+        self.replay = None #The Replay playing a recording into this game (set by Replay)
+        self.quick_loss = self.headless #Skips the loss sequence and starts the next level straight away (a replay turns this off)
 
         # Initialize game state
         self.setup_game_state()
 
+        # Levels are built (in the background when there is a window) by the level pipeline
+        self.pipeline = LevelPipeline(self.difficulty, self.difficultychoice, load_images=not self.headless, background=not self.headless, pack=self.pack)
+
         # Initialize maze and entities
         self.setup_entities()
 
+        # Start building the next level in the background
+        self.prefetch(self.wins + 1)
+
         # Initialize audio
-        self.music = Audio()
+        self.music = SilentAudio() if self.headless else audio
 
         # Input handler
         self.input_handler = Input(self)
@@ -691,125 +2010,178 @@ class Game:
         self.max_time = 30
         self.timer = 0
         self.show_trail = False
+        self.chase_enabled = self.difficultychoice == False #The enemy only chases the player on hard difficulty
+        self.show_profile = False #Shows the profiler overlay (toggled in debug mode)
         self.clock = pygame.time.Clock()
+        self.drawn_rects = [] #Screen rectangles drawn over the background in the last frame
+        self.scene_rects = [] #Parts of the scene that have changed since the last frame
+        self.losing = False #True while the loss sequence (the loss sound and the trail) is playing
+        self.dirty = True #Something changed since the last frame so the game needs rendering
 
     def setup_entities(self):
         """
-        Initialize the maze, player, goal, enemy, and buffs.
-        """
-        self.grid_size = 10
-        self.cell_size = 84
-        self.maze = Maze(self.grid_size)
-        self.player = Entity(self.maze, grid_size=self.grid_size)
-        self.Goal = Entity(self.maze, (self.player.x, self.player.y), grid_size=self.grid_size)
-        self.Buffs = []
-        self.enemy = Entity(self.maze, (self.Goal.x, self.Goal.y), grid_size=self.grid_size)
-        self.enemy.x, self.enemy.y = self.player.x, self.player.y
-        self.shortestpath = self.maze.solve(
-            (self.enemy.x, self.enemy.y), (self.Goal.x, self.Goal.y), self.grid_size
-        )
+        Initialize the maze, player, goal, enemy, and buffs of the first level. It is built through the difficulty
+        like every other level, so the difficulty, camera and map scale change its size too.
+        """
+        self.load_level(self.pipeline.take(self.wins, self.level_seed(self.wins)))
+        self.levels_started = self.levels_started + 1
+        if not self.headless:
+            self.build_background()
 
-        # Add an initial buff
-        new_buff = Entity(
-            self.maze, (self.player.x, self.player.y), (self.Goal.x, self.Goal.y), grid_size=self.grid_size
-        )
-        self.Buffs.append(new_buff)
+    def now(self):
+        """
+        Returns the current time in seconds. A headless game uses its own clock so it can run faster than real time.
+        A recorded game uses the recorder's clock, which only changes between steps, so a replay sees the same times.
+        """
+        if self.headless:
+            return self.simulated_time
+        if self.recorder is not None:
+            return self.recorder.clock
+        return time.time()
 
-    def reset(self, images):
+    def step_clock(self):
         """
-        Resets the game state.
+        Moves the headless clock forward by one logic tick
         """
-        menu = Menu(self.images)
-        self.handle_win()
-        self.grid_size, self.cell_size, = self.difficulty.set_values(self.wins)
-        self.reset_values()
-        self.handle_buff_count()
+        self.simulated_time = self.simulated_time + logic_tick
 
-    def handle_buff_count(self):
+    def level_seed(self, wins):
         """
-        Handles the generation of buffs based on the wins 
+        Returns the seed of the next level to be started for the wins. It is made from the game's seed, the number of
+        levels started and the wins so it is the same whether the level is built in the background or on the spot.
         """
-        count = 0
-        count = count + 1
-        if self.wins > 4: #Adds an extra buff past 5 wins
-            count = count + 1
-        wincount = self.wins // 10
-        if wincount >= 1 and wincount <= 5: #Increments the count for every 10 wins 
-            count = count + wincount
-        elif wincount > 5:
-            count = count + 5
-        while count != 0: #Creates a new buff for every count that accumulated in the previous statements
-            new_buff = Entity(self.maze, (self.player.x, self.player.y), (self.Goal.x, self.Goal.y), *self.shortestpath, grid_size=self.grid_size)
-            self.Buffs.append(new_buff)
-            count = count - 1
-        self.max_time = self.difficulty.scale_time(self.wins, self.difficultychoice, self.shortestpath)
-        self.time = time.time()
+        return random.Random(f"{self.seed}/{self.levels_started}/{wins}").randrange(2 ** 63)
 
-    def reset_values(self):
+    def prefetch(self, wins):
         """
-        Resets the game state's values.
+        Starts building the next level for the wins in the background with the seed it will be played with
         """
-        self.images_instance = Load()
-        self.images = self.images_instance.images(self.cell_size, (self.grid_size * self.cell_size))
-        self.maze = Maze(self.grid_size)
-        self.player = Entity(self.maze, grid_size=self.grid_size)
-        self.Goal = Entity(self.maze, (self.player.x, self.player.y), grid_size=self.grid_size)
-        self.Buffs = []
-        self.enemy = Entity(self.maze, (self.player.x, self.player.y), (self.Goal.x, self.Goal.y), grid_size=self.grid_size)
-        self.enemy.x, self.enemy.y = self.player.x, self.player.y
-        self.shortestpath = self.maze.solve((self.enemy.x, self.enemy.y), (self.Goal.x, self.Goal.y), self.grid_size)
+        self.pipeline.prefetch(wins, self.level_seed(wins))
+
+    def reset(self, images):
+        """
+        Resets the game state. The level is taken from the level pipeline which has usually already built it in the
+        background, then the level after it starts being built.
+        """
+        with profiler.phase("reset.take"):
+            self.load_level(self.pipeline.take(self.wins, self.level_seed(self.wins)))
+        self.levels_started = self.levels_started + 1
+        if not self.headless:
+            with profiler.phase("reset.background"):
+                self.build_background()
+        self.prefetch(self.wins + 1)
+
+    def load_level(self, level):
+        """
+        Makes the level the one being played and starts its timer
+        """
+        self.grid_size, self.cell_size = level.grid_size, level.cell_size
+        self.images = level.images
+        self.maze = level.maze
+        self.player = level.player
+        self.Goal = level.Goal
+        self.Buffs = level.Buffs
+        self.enemy = level.enemy
+        self.shortestpath = level.shortestpath
+        self.max_time = level.max_time
+        self.origin = (0, 0) #The whole maze is in view until build_background() places the camera
+        self.view_cells = self.grid_size
+        self.time = self.now()
+        self.start_chase()
+
+    def start_chase(self):
+        """
+        Gets the enemy ready to chase the player in the level that has just started. The enemy starts on the player's
+        cell so it waits for the head start before it moves. The level's start is kept for the trail.
+        """
+        self.start = (self.enemy.x, self.enemy.y)
+        self.caught = False
+        self.chase_start = self.now() + chase_head_start
+        self.next_chase_move = self.chase_start
+        self.chase = ChasePlanner(self.maze, self.enemy, self.player, self.grid_size)
 
     def handle_win(self):
         """
-        Handles the case in which the player wins at level 30. It then updates the top score if beaten and
-        uses a text file to store the information
+        Handles the case in which the player wins at level 30. It then adds the score to the score store and shows
+        the high scores. It is called once by handle_goal() when the wins reach 31, so a loss or reset afterwards does
+        not save the game again. Headless games do not save scores or show the menus.
         """
-        if self.wins == 31:
-            # Read the current top score from the file
-            try:
-                with open("scores.txt", "r") as file:
-                    lines = file.readlines()
-                    top_score = int(lines[1].strip()) if len(lines) > 1 else 0
-                    file.close()  # Explicitly close the file after reading
-            except (FileNotFoundError, ValueError, IndexError):
-                # Handle missing file or invalid data
-                top_score = 0
-
-            # Update the top score if the current score is higher
-            top_score = max(self.score, top_score)
-
-            # Write the current score and updated top score to the file
-            with open("scores.txt", "w") as file:
-                file.write(f"{self.score}\n")  # First line: Current score
-                file.write(f"{top_score}\n")  # Second line: Top score
-                file.close()  # Explicitly close the file after writing
+        if not self.headless:
+            self.scores.add(self.score, self.wins, self.difficultychoice, self.player_name)
 
             # Show the high scores screen
-            menu.run_win_menu()
+            menu = Menu(self.images)
+            menu.run_win_menu(self.scores, self.score)
+        self.menu_closed()
+
+    def menu_closed(self):
+        """
+        Moves the clock on past a menu that was shown during a logic step (the win menu), so the next level's timer and
+        head start begin when the menu closes. A recorded game records the new time and a replay reads it back.
+        """
+        if self.recorder is not None:
+            self.recorder.tick()
+            self.recorder.record(record_menu_closed)
+        elif self.replay is not None:
+            self.simulated_time = self.replay.menu_closed()
+
+    def handle_chase(self):
+        """
+        Moves the enemy one step closer to the player every chase interval once the head start is over.
+        The player is caught if the enemy reaches them (or they walk into the enemy) after the head start.
+        """
+        if self.chase_enabled == False:
+            return
+        self.chase.follow(self.player.x, self.player.y) #Keeps the enemy's path up to date with the player's moves
+        now = self.now()
+        if now >= self.next_chase_move:
+            self.next_chase_move = now + chase_interval
+            if self.chase.step():
+                self.dirty = True
+        if now >= self.chase_start and (self.enemy.x, self.enemy.y) == (self.player.x, self.player.y):
+            self.caught = True
 
     def handle_loss(self):
         """
-        Handles the case when the player loses. It shows the shortest path and cancels any input except for quitting
+        Handles the case when the player loses (the time runs out or the enemy catches them). It starts the loss
+        sequence, which plays the loss sound and shows the shortest path while any input except for quitting is
+        ignored. The sequence is carried on by update_loss() in the main loop so the game keeps running.
         """
-        if self.timer == 0:
+        if (self.timer == 0 or self.caught == True) and self.losing == False:
                 self.loss = self.loss + 1
-                self.music.stop()
-                self.music.play_loss()
-                settime = time.time()
-                audiotime = 0
-                self.shortestpath = self.maze.solve((self.enemy.x, self.enemy.y), (self.Goal.x, self.Goal.y), self.grid_size)
-                Load.loadTrail(self.shortestpath, self.cell_size, self.images)
-                pygame.display.update()
-                while audiotime < 12: #Plays the audio until it finishes and shows the trail during this time and halts any input until it ends
-                    audiotime = time.time() - settime
-                    for event in pygame.event.get():
-                        if event.type == pygame.QUIT:
-                            pygame.quit()
-                            exit()
-                    pygame.time.delay(100) #Delay to save processing power. Otherwise it will urn as fast as it possibly can and lag.
-                self.music.stop()
-                self.reset(images)
-                self.music.play_soundtrack()
+                if self.quick_loss: #Nothing to show or play so the next level starts straight away
+                    self.reset(self.images)
+                    return
+                self.music.play_loss() #Crossfades from the soundtrack to the loss sound
+                self.losing = True
+                self.loss_time = self.now()
+                self.revealed = 0 #Number of trail cells drawn so far
+                self.shortestpath = self.maze.solve(self.start, (self.Goal.x, self.Goal.y), self.grid_size) #Already worked out when the level was built
+                if not self.headless and self.scene is self.background: #Draws the trail on a copy so the maze background stays clean
+                    self.scene = self.background.copy()
+                self.prefetch(self.wins) #The level after a loss has the same wins so it is built while the sound plays
+
+    def update_loss(self):
+        """
+        Carries on the loss sequence. The trail is drawn a few cells at a time over the reveal time and the next level
+        starts when the loss sound has finished.
+        """
+        elapsed = self.now() - self.loss_time
+        if elapsed >= loss_duration:
+            self.losing = False
+            self.reset(self.images)
+            self.music.play_soundtrack() #Crossfades from the end of the loss sound back to the soundtrack
+            return
+        if self.headless: #A replay only needs to know when the sequence ends
+            return
+        reveal = min(len(self.shortestpath), math.ceil(elapsed / loss_reveal_time * len(self.shortestpath))) #Cells that should be showing by now
+        if reveal > self.revealed:
+            cells = self.in_view(self.shortestpath[self.revealed:reveal])
+            Load.loadTrail(cells, self.cell_size, self.images, self.scene, self.origin)
+            left, top = self.origin
+            self.scene_rects.extend(pygame.Rect((x - left) * self.cell_size, (y - top) * self.cell_size, self.cell_size, self.cell_size) for x, y in cells)
+            self.revealed = reveal
+            self.dirty = True
 
     def handle_buff(self):
         """
@@ -818,34 +2190,117 @@ class Game:
         for Buff in self.Buffs: #Goes through each buff in the tuple self.Buffs
             if self.player.x == Buff.x and self.player.y == Buff.y: #Case when the player gets the buff
                 self.Buffs.remove(Buff) #Pops the Buff object from the self.Buffs tuple
+                self.dirty = True
                 self.score = self.score + 400 #Grants score for getting a buff
                 if self.difficultychoice == True: #Easy difficulty
                     self.time = self.time + min(30, 10 + 10 * (0.1 * self.wins)) #Dynamically gives bonus time based on the wins until the limit
                 elif self.difficultychoice == False: #Hard difficulty
                     self.time = self.time + min(25, 5 + 10 * (0.1 * self.wins)) #Dynamically gives bonus time based on the wins until the limit
-                Load.unloadBuff(self.Goal, self.player, self.enemy, self.Buffs, self.images, self.cell_size)
+                if not self.headless:
+                    Load.unloadBuff(self.Goal, self.player, self.enemy, self.Buffs, self.images, self.cell_size, self.origin)
                 self.music.play_buff()
 
-    def draw_grid(self):
+    def draw_grid(self, surface):
+        """
+        Draws the grid with the tile images onto the surface. Only the cells in view (from self.origin, view_cells across and down)
+        are drawn, which is the whole maze unless the camera is on. Every tile comes from the tile atlas and the cells are drawn
+        with one call to blits(), so drawing costs the same however big the maze is.
+        """
+        atlas = asset_cache.atlas(self.images, self.cell_size)
+        cells = self.maze.cells
+        left, top = self.origin
+        surface.blits(
+            (
+                #If grid position is 1, Draw the scaled wall image (index 0) onto the cell position, otherwise draw the path image (index 1)
+                atlas.sprite(0 if cells[y * self.grid_size + x] == 1 else 1, x - left, y - top)
+                for y in range(top, top + self.view_cells) #Selects each cell in view top to bottom, left to right
+                for x in range(left, left + self.view_cells)
+            ),
+            doreturn=False,
+        )
+
+    def camera_origin(self):
+        """
+        Returns the grid position at the top left of the view. The camera keeps the player in the middle of the
+        screen, but stops at the edges of the maze. Without the camera the whole maze is in view.
+        """
+        if self.camera == False:
+            return (0, 0)
+        furthest = self.grid_size - self.view_cells
+        half = self.view_cells // 2
+        return (min(max(self.player.x - half, 0), furthest), min(max(self.player.y - half, 0), furthest))
+
+    def build_background(self):
+        """
+        Draws the part of the maze in view onto an off-screen surface so each frame only has to copy it instead of drawing every tile.
+        This is the whole maze unless the camera is on, in which case it is redrawn whenever the camera moves.
+        """
+        self.view_cells = min(self.grid_size, screen_size // self.cell_size) if self.camera else self.grid_size
+        self.origin = self.camera_origin()
+        view_size = self.view_cells * self.cell_size
+        self.background = pygame.Surface((view_size, view_size)).convert()
+        self.draw_grid(self.background)
+        self.build_scene()
+
+    def update_camera(self):
+        """
+        Moves the camera to follow the player. The cells in view are drawn again onto the same background surface.
+        """
+        origin = self.camera_origin()
+        if origin != self.origin:
+            self.origin = origin
+            self.draw_grid(self.background)
+            self.build_scene()
+
+    def build_scene(self):
         """
-        Draws the grid with the tile images. If the player toggles show trail in debug mode, it also draws the trail
+        Builds the surface that the entities are drawn on top of. This is the maze background plus the trail if
+        the player toggles show trail in debug mode. The whole screen is redrawn on the next frame.
         """
-        for y in range(self.grid_size): #Selects each cell top to bottom, left to right
-            for x in range(self.grid_size):
-                if self.maze.grid[y][x] == 1: #If grid position is 1, Draw the scaled path image onto the cell position
-                    screen.blit(self.images[0], (x * self.cell_size, y * self.cell_size))
-                else: #If grid position isnt 1, Draw the scaled wall time image onto the cell position
-                    screen.blit(self.images[1], (x * self.cell_size, y * self.cell_size))
         if self.show_trail == True: #If the show_trail is toggled from the debug menu, Load the trail and draw it using the alien trail images.
-            Load.loadTrail(self.shortestpath, self.cell_size, self.images)
-            pygame.display.update() #Update the display to show the changes made
+            self.scene = self.background.copy()
+            Load.loadTrail(self.in_view(self.shortestpath), self.cell_size, self.images, self.scene, self.origin)
+        else:
+            self.scene = self.background
+        self.full_redraw = True
 
-    def render_game(self):
+    def in_view(self, positions):
+        """
+        Returns the grid positions which are in view
         """
-        Renders the game with entities and the grid
+        if self.camera == False:
+            return positions
+        left, top = self.origin
+        return [(x, y) for x, y in positions if left <= x < left + self.view_cells and top <= y < top + self.view_cells]
+
+    def render_game(self):
         """
-        self.draw_grid()
-        Load.entities(self.Goal, self.player, self.enemy, self.Buffs, self.images, self.cell_size)
+        Renders the game with entities and the grid. Only the cells that were covered by an entity in the last frame
+        and the cells covered by an entity now are redrawn and updated on the display, unless the whole screen needs redrawing.
+        """
+        if self.camera == True:
+            self.update_camera()
+        view = self.scene.get_rect()
+        new_rects = [rect for rect in Load.entityRects(self.Goal, self.player, self.enemy, self.Buffs, self.cell_size, self.origin) if view.colliderect(rect)]
+        if self.full_redraw == True: #A new level, the trail being toggled or coming back from a menu needs the whole screen redrawn
+            screen.fill((0, 0, 0))
+            screen.blit(self.scene, (0, 0))
+            dirty_rects = [screen.get_rect()]
+            self.full_redraw = False
+        else:
+            dirty_rects = self.drawn_rects + self.scene_rects + new_rects
+            for rect in self.drawn_rects + self.scene_rects: #Covers the entities from the last frame and the changed parts of the scene with the scene underneath them
+                screen.blit(self.scene, rect, rect)
+        self.scene_rects = []
+        Load.entities(self.Goal, self.player, self.enemy, self.Buffs, self.images, self.cell_size, self.origin)
+        if self.show_profile == True: #Draws the profiler overlay on top and covers it with the background on the next frame
+            overlay_rect = screen.blit(profiler.overlay(), (0, 0))
+            new_rects.append(overlay_rect)
+            dirty_rects.append(overlay_rect)
+        pygame.display.update(dirty_rects) #Only updates the parts of the display that changed
+        self.drawn_rects = new_rects
+        self.dirty = False
+        self.clock.tick() #Counts the frames drawn for the FPS shown in the caption
 
     def handle_goal(self):
         """
@@ -855,13 +2310,17 @@ class Game:
             self.music.play_win()
             self.wins = self.wins + 1
             self.score = self.score + 1000
-            self.reset(images)
+            if self.wins == 31: #Only the win that reaches level 31 finishes the game
+                self.handle_win()
+            self.reset(self.images)
 
     def update_timer_and_stats(self):
         """
         Updates the status of the current level by showing the level, score, and timer
         """
-        self.timer = max(0, self.max_time + (self.time - time.time()))
+        self.timer = max(0, self.max_time + (self.time - self.now()))
+        if self.headless:
+            return
         fps = self.clock.get_fps()
         pygame.display.set_caption(
             f"(Level: {self.wins})(Time remaining: {self.timer:.1f})(Score: {self.score})(FPS: {fps:.0f})"
@@ -869,31 +2328,384 @@ class Game:
 
     def run(self, images):
         """
-        The main game loop. This loops many times per second so a delay is added to control the processes
+        The main game loop. The game logic (movement, goal, buffs, timer and loss) runs once every logic tick, or straight
+        away when a movement key is pressed so the input is not delayed. The game is only rendered when something has
+        changed, and between ticks the loop sleeps in pygame.event.wait() until an event arrives or the next tick is due.
         """
         self.music.play_soundtrack()
-        self.time = time.time()
+        if self.recorder is not None:
+            self.recorder.start()
+        self.time = self.now()
+        self.start_chase() #The head start counts from when the game starts
+        next_tick = time.perf_counter()
         while self.running:
-            pygame.time.delay(100)
-            #Handle input
-            self.input_handler.hotkeys(images)
-            self.input_handler.handle_movement()
+            #Wait for input or for the next logic tick
+            timeout = int((next_tick - time.perf_counter()) * 1000)
+            event = pygame.event.wait(timeout) if timeout > 0 else pygame.event.poll() #wait(0) would wait forever so a tick that is due only checks for events
+            events = [] if event.type == pygame.NOEVENT else [event] + pygame.event.get()
+            if self.recorder is not None:
+                self.recorder.tick()
 
-            #Handle events
+            #Handle input
+            with profiler.phase("input"):
+                movement_pressed = self.input_handler.hotkeys(images, events)
+            if not self.running:
+                break
+
+            if self.losing == True: #The loss sequence replaces the game logic until it ends
+                if time.perf_counter() >= next_tick:
+                    next_tick = time.perf_counter() + logic_tick
+                    self.logic_step(0)
+            elif movement_pressed or time.perf_counter() >= next_tick:
+                next_tick = time.perf_counter() + logic_tick #Holding the key moves again after a full tick
+                with profiler.phase("movement"):
+                    mask = self.input_handler.handle_movement()
+                self.logic_step(mask)
+                profiler.maybe_dump()
+
+            if self.dirty or self.full_redraw:
+                with profiler.phase("render"):
+                    self.render_game()
+        profiler.dump()
+
+    def logic_step(self, mask):
+        """
+        Runs one step of the game logic with the movement keys in the bitmask. The main loop and Replay both use this,
+        so a replay makes exactly the same moves in the same order as the game that was recorded.
+        """
+        if self.recorder is not None:
+            self.recorder.record(mask)
+        if self.losing == True:
+            with profiler.phase("loss"):
+                self.update_loss()
+            return
+        with profiler.phase("movement"):
+            self.input_handler.apply_movement(mask)
+
+        #Handle events
+        with profiler.phase("goal"):
             self.handle_goal()
-            self.render_game()
+        with profiler.phase("buff"):
             self.handle_buff()
-            self.update_timer_and_stats()
+        with profiler.phase("chase"):
+            self.handle_chase()
+        self.update_timer_and_stats()
 
-            #Handle loss if any  
+        #Handle loss if any  
+        with profiler.phase("loss"):
             self.handle_loss()
-            pygame.display.update()
-            self.clock.tick(60)
-screen = pygame.display.set_mode((screen_size, screen_size)) #Set the screen size
-pygame.display.set_caption("maze game v1.0") #Set the caption
-images_instance = Load()
-images = images_instance.images(cell_size, screen_size)
-menu = Menu(images)
-difficultychoice, debug_mode = Menu.run_menu(menu)
-game = Game(images, difficultychoice, debug_mode)
-game.run(images)
\ No newline at end of file
+        if self.show_profile == True: #Keeps the overlay's numbers up to date
+            self.dirty = True
+
+class Simulation:
+    """
+    Runs the game logic without a window, audio or menus as fast as possible. Each step is one logic tick of
+    the normal game: the player makes one move, then the goal, buffs, timer and loss are checked.
+    The input is either random moves, moves along the shortest path ("solver") or a function which is given the
+    game and returns the (dx, dy) move to make (one of directions, or (0, 0) to stay still).
+    The moves are turned into key states and run through Game.logic_step(), the same code the main loop and Replay use.
+    """
+    def __init__(self, difficultychoice, policy="random", seed=None, pack=None, scores=None, batch_size=10000):
+        """
+        Creates the headless game. The seed makes the random moves and the mazes repeatable.
+        The levels are taken from the level pack (if one is given) when it has them.
+        If a score store is given the score at the end of every level is saved in it, batch_size levels at a time.
+        """
+        self.rng = random.Random(seed)
+        self.game = Game(None, difficultychoice, False, headless=True, pack=pack, seed=seed)
+        if policy == "random":
+            self.policy = self.random_move
+        elif policy == "solver":
+            self.policy = self.solver_move
+        elif callable(policy):
+            self.policy = policy
+        else:
+            raise ValueError(f"Unknown input policy: {policy}")
+        self.player = f"simulation:{policy if isinstance(policy, str) else 'custom'}" #The name the scores are saved under
+        self.scores = scores
+        self.batch_size = batch_size
+        self.pending_scores = [] #Scores waiting to be saved together
+        self.steps = 0
+
+    def random_move(self, game):
+        """
+        Picks a random direction
+        """
+        return self.rng.choice(directions)
+
+    def solver_move(self, game):
+        """
+        Moves one step along the shortest path to the goal
+        """
+        distances, parents = game.maze.distance_field((game.Goal.x, game.Goal.y), game.grid_size)
+        following = parents[game.player.y * game.grid_size + game.player.x] #Next cell on the way to the goal
+        if following == -1:
+            return (0, 0)
+        return following % game.grid_size - game.player.x, following // game.grid_size - game.player.y
+
+    def step(self):
+        """
+        Runs one logic tick of the game
+        """
+        game = self.game
+        move = self.policy(game)
+        game.step_clock()
+        game.logic_step(move_masks[tuple(move)])
+        self.steps = self.steps + 1
+        if self.scores is not None and game.wins + game.loss > self.levels_finished: #A level has just been won or lost
+            self.levels_finished = game.wins + game.loss
+            self.pending_scores.append((self.player, game.difficultychoice, game.score, game.wins, time.time()))
+            if len(self.pending_scores) >= self.batch_size:
+                self.save_scores()
+
+    def save_scores(self):
+        """
+        Saves the waiting scores in one transaction
+        """
+        if self.scores is not None and self.pending_scores:
+            self.scores.add_many(self.pending_scores)
+            self.pending_scores = []
+
+    def run(self, levels):
+        """
+        Plays until the amount of levels have been won or lost and returns the results
+        """
+        game = self.game
+        self.levels_finished = game.wins + game.loss
+        start = time.perf_counter()
+        while game.wins + game.loss < levels:
+            self.step()
+        self.save_scores()
+        elapsed = time.perf_counter() - start
+        return {
+            "levels": game.wins + game.loss,
+            "wins": game.wins,
+            "losses": game.loss,
+            "score": game.score,
+            "steps": self.steps,
+            "seconds": elapsed,
+            "levels_per_second": (game.wins + game.loss) / elapsed if elapsed > 0 else 0.0,
+        }
+
+record_magic = b"NEAINPUT"
+record_version = 4
+record_header = struct.Struct("<8sIqBBBB8s") #magic, version, game seed, difficulty, debug mode, camera, map scale, level pack fingerprint
+no_pack = bytes(8) #Pack fingerprint saved when the game did not use a level pack
+record_entry = struct.Struct("<IH") #milliseconds since the game started, key state
+record_left = 1 #Key state bits of the movement keys held down (or tapped) in a logic step
+record_right = 2
+record_up = 4
+record_down = 8
+record_hotkey = 0x8000 #Set in the key state of a hotkey press. The rest of it is the hotkey's position in record_hotkeys
+record_hotkeys = [
+    pygame.K_m, pygame.K_r, pygame.K_t, pygame.K_q, pygame.K_e, pygame.K_y, pygame.K_x,
+    pygame.K_u, pygame.K_i, pygame.K_j, pygame.K_k, pygame.K_c, pygame.K_p,
+] #Every key the game handles apart from the movement keys. Other keys (such as shift or the F keys) are not recorded
+move_masks = {(0, 0): 0, (-1, 0): record_left, (1, 0): record_right, (0, -1): record_up, (0, 1): record_down} #(dx, dy) -> key state
+record_menu_closed = record_hotkey | 0x7FFF #Key state of the entry saying when a menu shown during a logic step closed
+
+class InputRecorder:
+    """
+    Records a game's input into a compact binary file so it can be played back by Replay. The file starts with a header
+    holding the game's seed and settings (including which level pack was used, if any), followed by one 6 byte entry for every logic step (the movement keys as a
+    bitmask) and every hotkey press (its position in record_hotkeys with record_hotkey set). Every entry holds the game time in milliseconds.
+    The recorded game runs on the recorder's clock, which is rounded to the millisecond and only moves on between
+    steps, so the replay sees exactly the times the game saw. The only exception is the win menu, which is shown in the
+    middle of a step: the clock moves on when it closes and a record_menu_closed entry saves the new time.
+    """
+    def __init__(self, path, difficultychoice, debug_mode, seed, camera=False, map_scale=1, pack=None):
+        """
+        Creates the file and writes the header. The level pack is the one the game takes its levels from (if any).
+        """
+        if not -2 ** 63 <= seed < 2 ** 63 or not 1 <= map_scale <= 255:
+            raise ValueError("the seed must fit in 64 bits and the map scale must be between 1 and 255 to be recorded")
+        self.file = open(path, "wb", buffering=65536) #Entries are only written to disk in large blocks
+        self.file.write(record_header.pack(
+            record_magic, record_version, seed, 1 if difficultychoice else 0, 1 if debug_mode else 0, 1 if camera else 0, map_scale,
+            pack.fingerprint() if pack is not None else no_pack,
+        ))
+        self.clock = 0.0
+        self.started = time.perf_counter()
+        self.entries = 0
+
+    def start(self):
+        """
+        Starts the clock from 0
+        """
+        self.started = time.perf_counter()
+        self.clock = 0.0
+
+    def tick(self):
+        """
+        Moves the clock on to the current time (to the millisecond)
+        """
+        self.clock = round((time.perf_counter() - self.started) * 1000) / 1000
+
+    def record(self, state):
+        """
+        Writes an entry for the key state at the current time
+        """
+        self.file.write(record_entry.pack(round(self.clock * 1000), state))
+        self.entries = self.entries + 1
+
+    def close(self):
+        """
+        Writes any entries that are still buffered and closes the file
+        """
+        if not self.file.closed:
+            self.file.close()
+
+class Replay:
+    """
+    Plays a recording made by InputRecorder back into a headless game as fast as possible. The game has the recorded
+    seed and settings, so it builds the same levels, and every entry is applied at its recorded time, so the result
+    (wins, losses, score and where everything ends up) matches the recorded game. Recordings can be kept as a regression
+    corpus: if a change to the game logic changes the result of a replay, the change is not just a speed up.
+    """
+    def __init__(self, path, pack=None):
+        """
+        Reads the recording and creates the headless game it is played back into. The level pack has to be the one the
+        game was recorded with (or None if it did not use one), otherwise it would build different levels.
+        """
+        with open(path, "rb") as file:
+            data = file.read()
+        if len(data) < record_header.size:
+            raise ValueError(f"{path} is too short to be a recording")
+        magic, version, seed, difficultychoice, debug_mode, camera, map_scale, pack_fingerprint = record_header.unpack_from(data)
+        if magic != record_magic:
+            raise ValueError(f"{path} is not a recording")
+        if version != record_version:
+            raise ValueError(f"{path} is recording version {version}, only version {record_version} can be played")
+        if pack is None and pack_fingerprint != no_pack:
+            raise ValueError(f"{path} was recorded with a level pack, give the same pack with --level-pack to replay it")
+        if pack is not None and pack_fingerprint == no_pack:
+            raise ValueError(f"{path} was recorded without a level pack, replay it without --level-pack")
+        if pack is not None and pack.fingerprint() != pack_fingerprint:
+            raise ValueError(f"{path} was recorded with a different level pack")
+        self.seed = seed
+        self.entries = memoryview(data)[record_header.size:len(data) - (len(data) - record_header.size) % record_entry.size] #A partly written last entry is ignored
+        self.game = Game(None, difficultychoice == 1, debug_mode == 1, headless=True, pack=pack, seed=seed, camera=camera == 1, map_scale=map_scale)
+        self.game.quick_loss = False #The recorded game played the loss sequence so the next level started later
+        self.game.replay = self
+        self.pending = None #Iterator over the entries that have not been applied yet
+
+    def menu_closed(self):
+        """
+        Returns the time (in seconds) of the next entry, which has to say when the menu being shown closed
+        """
+        milliseconds, state = next(self.pending, (None, None))
+        if state != record_menu_closed:
+            raise ValueError("The recording does not match the game: a menu was shown but the recording has no time for when it closed")
+        return milliseconds / 1000
+
+    def run(self):
+        """
+        Applies every entry to the game and returns the results
+        """
+        game = self.game
+        steps = 0
+        start = time.perf_counter()
+        self.pending = record_entry.iter_unpack(self.entries)
+        for milliseconds, state in self.pending: #A logic step may take the next entry itself (see menu_closed())
+            game.simulated_time = milliseconds / 1000
+            if state & record_hotkey:
+                code = state & ~record_hotkey
+                if code < len(record_hotkeys):
+                    game.input_handler.replay_key(record_hotkeys[code])
+            else:
+                game.logic_step(state)
+                steps = steps + 1
+        elapsed = time.perf_counter() - start
+        return {
+            "seed": self.seed,
+            "levels": game.wins + game.loss,
+            "wins": game.wins,
+            "losses": game.loss,
+            "score": game.score,
+            "steps": steps,
+            "game_seconds": game.simulated_time,
+            "seconds": elapsed,
+            "player": (game.player.x, game.player.y),
+            "enemy": (game.enemy.x, game.enemy.y),
+            "goal": (game.Goal.x, game.Goal.y),
+        }
+
+asset_cache = AssetCache() #Shared by every Load object so each level reuses the images that are already decoded
+profiler = Profiler() #Shared by the game and the levels being built in the background
+audio = Audio() #Shared by the menus and the game so the sounds are only loaded once
+
+def main():
+    """
+    Starts the game, or the headless simulation when --headless is given
+    """
+    global screen
+    parser = argparse.ArgumentParser(description="maze game")
+    parser.add_argument("--headless", action="store_true", help="run the game logic with no window, audio or menus")
+    parser.add_argument("--levels", type=int, default=1000, help="levels to play in the headless simulation")
+    parser.add_argument("--difficulty", choices=["easy", "hard"], default="easy", help="difficulty of the headless simulation")
+    parser.add_argument("--policy", choices=["random", "solver"], default="solver", help="input used by the headless simulation")
+    parser.add_argument("--seed", type=int, default=None, help="seed the levels are made from (and the moves of the headless simulation)")
+    parser.add_argument("--level-pack", default=None, help="level pack file to take the levels from instead of generating them")
+    parser.add_argument("--player", default="player", help="name the scores are saved under")
+    parser.add_argument("--score-db", default=None, help="score database for the headless simulation to save every level's score in (keep it separate from scores.db)")
+    parser.add_argument("--camera", action="store_true", help="keep the cells big enough to read and follow the player around the maze")
+    parser.add_argument("--map-scale", type=int, default=1, help="make every maze this many times wider and taller (use with --camera)")
+    parser.add_argument("--profile", default=None, metavar="JSON", help="time the phases of the game and save the percentiles to this file")
+    parser.add_argument("--record", default=None, metavar="FILE", help="record the game's input into this file so it can be replayed")
+    parser.add_argument("--replay", default=None, metavar="FILE", help="play a recording back without a window as fast as possible and print the result")
+    args = parser.parse_args()
+    if args.map_scale < 1:
+        parser.error("--map-scale must be at least 1")
+    if args.map_scale > 1 and not args.camera: #Only the camera difficulty scales the maps
+        parser.error("--map-scale needs --camera")
+    pack = LevelPack(args.level_pack) if args.level_pack else None
+    if args.profile:
+        profiler.enabled = True
+        profiler.dump_path = args.profile
+
+    if args.headless:
+        scores = ScoreStore(args.score_db) if args.score_db else None
+        simulation = Simulation(args.difficulty == "easy", args.policy, args.seed, pack, scores)
+        results = simulation.run(args.levels)
+        print(
+            f"{results['levels']} levels ({results['wins']} wins, {results['losses']} losses) in {results['seconds']:.2f}s "
+            f"({results['levels_per_second']:.0f} levels/s, {results['steps']} steps)"
+        )
+        profiler.dump()
+        return
+
+    if args.replay:
+        try:
+            replay = Replay(args.replay, pack)
+        except ValueError as e:
+            parser.error(str(e))
+        results = replay.run()
+        print(
+            f"seed {results['seed']}: {results['levels']} levels ({results['wins']} wins, {results['losses']} losses), score {results['score']}, "
+            f"player {results['player']}, enemy {results['enemy']}, goal {results['goal']}"
+        )
+        print(f"Replayed {results['steps']} steps ({results['game_seconds']:.1f}s of play) in {results['seconds']:.2f}s")
+        profiler.dump()
+        return
+
+    pygame.init()
+    audio.start() #Loads every sound before the menus so nothing is loaded during the game
+    screen = pygame.display.set_mode((screen_size, screen_size)) #Set the screen size
+    pygame.display.set_caption("maze game v1.0") #Set the caption
+    images_instance = Load()
+    images = images_instance.images(cell_size, screen_size, first=[7, 8]) #Only the main menu frames are decoded before the menu is shown
+    menu = Menu(images)
+    difficultychoice, debug_mode = Menu.run_menu(menu)
+    if args.profile:
+        print(f"First menu frame shown {Menu.first_frame_time * 1000:.0f} ms after startup")
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 63)
+    recorder = InputRecorder(args.record, difficultychoice, debug_mode, seed, args.camera, args.map_scale, pack) if args.record else None
+    game = Game(images, difficultychoice, debug_mode, pack=pack, seed=seed, camera=args.camera, map_scale=args.map_scale, player=args.player, recorder=recorder)
+    try:
+        game.run(images)
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+if __name__ == "__main__":
+    main()
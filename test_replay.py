@@ -0,0 +1,149 @@
+"""
+Checks that a recorded game played back by Replay ends in the same state as the game that was recorded.
+
+Usage:
+python -m pytest test_replay.py
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") #The recorded game is drawn off screen so no window is needed
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import pytest
+
+import side
+
+direction_bits = {(-1, 0): side.record_left, (1, 0): side.record_right, (0, -1): side.record_up, (0, 1): side.record_down}
+
+
+def key_event(key):
+    """
+    Returns a key press event like the ones pygame gives the main loop
+    """
+    return pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode="", scancode=0)
+
+
+def solver_mask(game):
+    """
+    Returns the key state that moves the player one step along the shortest path to the goal
+    """
+    _, parents = game.maze.distance_field((game.Goal.x, game.Goal.y), game.grid_size)
+    following = parents[game.player.y * game.grid_size + game.player.x]
+    if following == -1:
+        return 0
+    return direction_bits[(following % game.grid_size - game.player.x, following // game.grid_size - game.player.y)]
+
+
+def test_replay_matches_recorded_game(tmp_path):
+    """
+    Records a game with wins, a loss sequence and keys that are not hotkeys (shift and F1 have key codes far above
+    16 bits), then replays it and compares the results
+    """
+    pygame.init()
+    side.screen = pygame.display.set_mode((side.screen_size, side.screen_size))
+    path = tmp_path / "game.rec"
+    recorder = side.InputRecorder(path, True, True, 42)
+    game = side.Game(None, True, True, seed=42, scores=side.ScoreStore(":memory:"), recorder=recorder)
+    game.music = side.SilentAudio()
+    recorder.start()
+    game.time = game.now()
+    game.start_chase()
+    for step in range(400):
+        recorder.clock = step * 100 / 1000 #One logic tick per step
+        if step == 100: #Three x presses run the timer out, which starts the loss sequence
+            game.input_handler.hotkeys(None, [key_event(pygame.K_LSHIFT), key_event(pygame.K_F1)] + [key_event(pygame.K_x)] * 3)
+        if step == 300:
+            game.input_handler.hotkeys(None, [key_event(pygame.K_q), key_event(pygame.K_RCTRL)])
+        game.logic_step(0 if game.losing else solver_mask(game))
+    recorder.close()
+    game.pipeline.discard()
+
+    assert recorder.entries == 400 + 4 #Every step and the x and q presses, but not shift, F1 or ctrl
+    assert game.loss == 1 and game.wins > 1
+    results = side.Replay(path).run()
+    assert (results["wins"], results["losses"], results["score"]) == (game.wins, game.loss, game.score)
+    assert results["player"] == (game.player.x, game.player.y)
+    assert results["enemy"] == (game.enemy.x, game.enemy.y)
+    assert results["goal"] == (game.Goal.x, game.Goal.y)
+
+
+def test_replay_after_win_menu(tmp_path, monkeypatch):
+    """
+    Records a hard game that reaches 31 wins, sits on the win menu for 2 seconds and then plays the next level
+    while the enemy chases. The next level's timer and head start have to begin when the menu closes, in the
+    recorded game and in the replay.
+    """
+    pygame.init()
+    side.screen = pygame.display.set_mode((side.screen_size, side.screen_size))
+    path = tmp_path / "game.rec"
+    recorder = side.InputRecorder(path, False, True, 7)
+    game = side.Game(None, False, True, seed=7, scores=side.ScoreStore(":memory:"), recorder=recorder)
+    game.music = side.SilentAudio()
+    wall_clock = [0.0] #Seconds since the recording started, standing in for time.perf_counter()
+
+    def sit_on_menu(menu, scores, current_score):
+        wall_clock[0] = wall_clock[0] + 2
+    monkeypatch.setattr(side.Menu, "run_win_menu", sit_on_menu)
+    monkeypatch.setattr(recorder, "tick", lambda: setattr(recorder, "clock", round(wall_clock[0], 3)))
+    recorder.start()
+    game.time = game.now()
+    game.start_chase()
+    game.input_handler.hotkeys(None, [key_event(pygame.K_q)] * 30)
+    menu_closed = None
+    for step in range(300):
+        wall_clock[0] = wall_clock[0] + 0.1
+        recorder.tick() #Like the main loop, once before every step
+        wins = game.wins
+        game.logic_step(0 if game.losing else solver_mask(game))
+        if wins == 30 and game.wins == 31:
+            menu_closed = round(wall_clock[0], 3) #The time the menu closed
+            assert game.time == menu_closed and game.chase_start == menu_closed + side.chase_head_start
+    recorder.close()
+    game.pipeline.discard()
+
+    assert menu_closed is not None
+    results = side.Replay(path).run()
+    assert (results["wins"], results["losses"], results["score"]) == (game.wins, game.loss, game.score)
+    assert results["player"] == (game.player.x, game.player.y)
+    assert results["enemy"] == (game.enemy.x, game.enemy.y)
+    assert results["goal"] == (game.Goal.x, game.Goal.y)
+
+
+def write_pack(path, seed):
+    """
+    Writes a small level pack with easy levels for the first few wins
+    """
+    with side.LevelPackWriter(path) as writer:
+        for wins in range(4):
+            writer.add(side.Level(side.Difficulty(True), True, wins, load_images=False, seed=seed + wins))
+    return side.LevelPack(path)
+
+
+def test_replay_needs_the_recorded_pack(tmp_path):
+    """
+    A game recorded with a level pack only replays with the same pack
+    """
+    pygame.init()
+    side.screen = pygame.display.set_mode((side.screen_size, side.screen_size))
+    pack = write_pack(tmp_path / "levels.pack", 1)
+    other_pack = write_pack(tmp_path / "other.pack", 100)
+    path = tmp_path / "game.rec"
+    recorder = side.InputRecorder(path, True, False, 3, pack=pack)
+    game = side.Game(None, True, False, seed=3, pack=pack, scores=side.ScoreStore(":memory:"), recorder=recorder)
+    game.music = side.SilentAudio()
+    recorder.start()
+    game.time = game.now()
+    game.start_chase()
+    for step in range(100):
+        recorder.clock = step * 100 / 1000
+        game.logic_step(solver_mask(game))
+    recorder.close()
+    game.pipeline.discard()
+
+    with pytest.raises(ValueError):
+        side.Replay(path)
+    with pytest.raises(ValueError):
+        side.Replay(path, other_pack)
+    results = side.Replay(path, pack).run()
+    assert (results["wins"], results["losses"], results["score"]) == (game.wins, game.loss, game.score)
+    assert results["player"] == (game.player.x, game.player.y)